@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-22
+Purpose: Asyncio crawl scheduler with bounded concurrency and rate limits
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import stage_metrics
+from http_quote import BOOKING_URL, HttpQuoteFetcher
+from vehicle_parser import parse_html, parse_page_count
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, bursts up to burst"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens +
+                                  (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CrawlStats:
+    """Counters for a crawl run"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.pages = 0
+        self.records = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.in_flight = 0
+        self.queue_depth = 0
+
+    def snapshot(self):
+        """Current counters plus throughput"""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            'jobs_done': self.jobs_done,
+            'jobs_failed': self.jobs_failed,
+            'pages': self.pages,
+            'records': self.records,
+            'retries': self.retries,
+            'cache_hits': self.cache_hits,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'elapsed': round(elapsed, 3),
+            'jobs_per_s': round(self.jobs_done / elapsed, 2),
+            'pages_per_s': round(self.pages / elapsed, 2),
+        }
+
+
+class AsyncCrawler:
+    """Pulls quote jobs off a queue and fetches them concurrently.
+
+    At most concurrency page fetches run at once and each host is held to
+    its own token bucket. A failed page fetch is retried with jittered
+    exponential backoff. Each quote's vehicles go to the async sink as
+    soon as all of its pages have been parsed. With a QuoteCache, a quote
+    still fresh in it is handed to the sink without any fetch.
+
+    Fetches run in asyncio.to_thread, and a requests session must not be
+    shared between threads, so each thread gets its own fetcher from
+    fetcher_factory; run() closes them all once the queue is done.
+    """
+
+    def __init__(self, sink=None, base_url=BOOKING_URL, concurrency=16,
+                 rate=5.0, burst=None, max_retries=3, backoff=0.5,
+                 fetcher_factory=None, cache=None):
+        self.sink = sink
+        self.cache = cache
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # one fetch at a time per thread, so one pooled connection each
+        self.fetcher_factory = fetcher_factory or (
+            lambda: HttpQuoteFetcher(base_url, pool_size=1))
+        self.local = threading.local()
+        self.fetchers = []
+        self.fetchers_lock = threading.Lock()
+        self.buckets = {}
+        self.stats = CrawlStats()
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(concurrency)
+
+    def bucket(self, url):
+        """Token bucket for the host of a URL"""
+        host = urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    def thread_fetcher(self):
+        """The calling thread's fetcher, created on its first fetch"""
+        fetcher = getattr(self.local, 'fetcher', None)
+        if fetcher is None:
+            fetcher = self.local.fetcher = self.fetcher_factory()
+            with self.fetchers_lock:
+                self.fetchers.append(fetcher)
+        return fetcher
+
+    def fetch_in_thread(self, args, page_index):
+        return self.thread_fetcher().fetch_page(args, page_index)
+
+    def close_fetchers(self):
+        """Close every thread's fetcher"""
+        with self.fetchers_lock:
+            fetchers, self.fetchers = self.fetchers, []
+        for fetcher in fetchers:
+            fetcher.close()
+        self.local = threading.local()
+
+    async def fetch_page(self, args, page_index):
+        """One result page, rate limited and retried with backoff"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket(self.base_url).acquire()
+            async with self.slots:
+                self.stats.in_flight += 1
+                try:
+                    return await asyncio.to_thread(self.fetch_in_thread,
+                                                   args, page_index)
+                except Exception:
+                    if attempt == self.max_retries:
+                        raise
+                finally:
+                    self.stats.in_flight -= 1
+            self.stats.retries += 1
+            delay = self.backoff * 2**attempt
+            await asyncio.sleep(delay * (0.5 + random.random()))
+
+    async def crawl_quote(self, args):
+        """Vehicles of every result page; pages after the first in parallel"""
+        first = await self.fetch_page(args, 1)
+        rest = await asyncio.gather(*(
+            self.fetch_page(args, page_index)
+            for page_index in range(2, parse_page_count(first) + 1)))
+
+        vehicles = []
+        for page_no, content in enumerate([first, *rest]):
+            self.stats.pages += 1
+            for vehicle in await asyncio.to_thread(parse_html, content):
+                vehicle['Page_No'] = page_no
+                vehicles.append(vehicle)
+        return vehicles
+
+    async def cached_quote(self, args):
+        """Vehicles from the cache when fresh, crawled and cached otherwise"""
+        if self.cache is None:
+            return await self.crawl_quote(args)
+        vehicles = self.cache.get(args)
+        if vehicles is not None:
+            self.stats.cache_hits += 1
+            return vehicles
+        vehicles = await self.crawl_quote(args)
+        self.cache.put(args, vehicles)
+        return vehicles
+
+    async def worker(self):
+        """Take jobs until cancelled"""
+        while True:
+            job_id, args = await self.queue.get()
+            self.stats.queue_depth = self.queue.qsize()
+            try:
+                vehicles = await self.cached_quote(args)
+                if self.sink is not None:
+                    await self.sink(job_id, vehicles)
+                self.stats.records += len(vehicles)
+                self.stats.jobs_done += 1
+            except Exception as error:
+                self.stats.jobs_failed += 1
+                print(f'Job {job_id} failed: '
+                      f'{type(error).__name__}: {error}')
+            finally:
+                self.queue.task_done()
+
+    async def run(self, jobs):
+        """Crawl (job_id, args) pairs; returns the final stats"""
+        for job in jobs:
+            self.queue.put_nowait(job)
+        self.stats.queue_depth = self.queue.qsize()
+
+        workers = [asyncio.create_task(self.worker())
+                   for _ in range(self.concurrency)]
+        try:
+            await self.queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.close_fetchers()
+        return self.stats.snapshot()
+
+
+class WriterSink:
+    """Async sink feeding a VehicleWriter from a worker thread; keys maps
+    job_id -> quote key stored with the job's vehicles"""
+
+    def __init__(self, writer, keys=None):
+        self.writer = writer
+        self.keys = keys or {}
+        self.lock = asyncio.Lock()
+
+    async def __call__(self, job_id, vehicles):
+        if job_id in self.keys:
+            for vehicle in vehicles:
+                vehicle['Quote_Key'] = self.keys[job_id]
+        async with self.lock:
+            await asyncio.to_thread(self.writer.write, vehicles)
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Async quote crawler',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('jobs',
+                        metavar='file',
+                        help='Quote parameter sets, .csv or .jsonl')
+
+    parser.add_argument('-c',
+                        '--concurrency',
+                        help='Page fetches in flight at once',
+                        metavar='int',
+                        type=int,
+                        default=16)
+
+    parser.add_argument('-r',
+                        '--rate',
+                        help='Requests per second per host',
+                        metavar='float',
+                        type=float,
+                        default=5.0)
+
+    parser.add_argument('-b',
+                        '--burst',
+                        help='Token bucket size (default: rate)',
+                        metavar='int',
+                        type=int)
+
+    parser.add_argument('--retries',
+                        help='Retries per page fetch',
+                        metavar='int',
+                        type=int,
+                        default=3)
+
+    parser.add_argument('--base_url',
+                        help='Booking app URL',
+                        metavar='url',
+                        type=str,
+                        default=BOOKING_URL)
+
+    parser.add_argument('--cache_file',
+                        help='SQLite quote cache shared across runs',
+                        metavar='path',
+                        type=str)
+
+    parser.add_argument('--cache_ttl',
+                        help='Seconds a cached quote stays fresh (0: no cache)',
+                        metavar='int',
+                        type=int,
+                        default=3600)
+
+    parser.add_argument('-n',
+                        '--dry_run',
+                        help='Parse only, do not store',
+                        action='store_true')
+
+    stage_metrics.add_arguments(parser)
+    return parser.parse_args()
+
+
+async def crawl(args):
+    """Run the crawl described by the command-line arguments"""
+    from crawl_jobs import job_args, read_jobs
+    from quote_cache import QuoteCache
+
+    jobs = []
+    for job in read_jobs(args.jobs):
+        try:
+            jobs.append((job['job_id'], job_args(job)))
+        except ValueError as error:
+            print(f'Job {job["job_id"]} skipped: {error}')
+    cache = (QuoteCache(args.cache_ttl, path=args.cache_file)
+             if args.cache_ttl > 0 else None)
+    crawler_args = dict(base_url=args.base_url,
+                        concurrency=args.concurrency, rate=args.rate,
+                        burst=args.burst, max_retries=args.retries,
+                        cache=cache)
+    if args.dry_run:
+        return await AsyncCrawler(**crawler_args).run(jobs)
+
+    from batch_ingest import open_writer
+    from quote_params import quote_key
+
+    keys = {job_id: quote_key(job) for job_id, job in jobs}
+    with open_writer('vehicle_quotes', 1000) as writer:
+        return await AsyncCrawler(WriterSink(writer, keys),
+                                  **crawler_args).run(jobs)
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    with stage_metrics.instrumented(args):
+        stats = asyncio.run(crawl(args))
+    print(' '.join(f'{key}={value}' for key, value in stats.items()))
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-05
+Purpose: Parse whole directories of saved booking pages across processes
+"""
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import stage_metrics
+from vehicle_parser import DATA_DIR, DEFAULT_ENGINE, ENGINES, parse_html_file
+from vehicle_report import REPORT_MODES, VehicleReporter
+
+_PAGE_NO = re.compile(r'page_(\d+)\.html$')
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Batch ingest of saved booking pages',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('directory',
+                        metavar='dir',
+                        nargs='?',
+                        default=DATA_DIR,
+                        help='Directory of saved page_N.html files')
+
+    parser.add_argument('-w',
+                        '--workers',
+                        help='Parser processes (default: CPU count)',
+                        metavar='int',
+                        type=int)
+
+    parser.add_argument('-c',
+                        '--chunk_size',
+                        help='Files handed to a worker at a time',
+                        metavar='int',
+                        type=int,
+                        default=16)
+
+    parser.add_argument('-e',
+                        '--engine',
+                        help='Parse engine',
+                        choices=ENGINES,
+                        default=DEFAULT_ENGINE)
+
+    parser.add_argument('-b',
+                        '--batch_size',
+                        help='Rows per database batch',
+                        metavar='int',
+                        type=int,
+                        default=1000)
+
+    parser.add_argument('-t',
+                        '--table',
+                        help='vehicle_quotes (typed, migrated), '
+                        'vehicle_fares (only fare changes, with validity '
+                        'times) or the legacy text vehicle_data table',
+                        choices=['vehicle_quotes', 'vehicle_fares',
+                                 'vehicle_data'],
+                        default='vehicle_quotes')
+
+    parser.add_argument('-k',
+                        '--quote_key',
+                        help='Quote key of the pages, required for '
+                        'vehicle_fares (default: the quote_key.txt the spider '
+                        'saved in dir)',
+                        metavar='text')
+
+    parser.add_argument('-p',
+                        '--parquet_dir',
+                        help='Write partitioned Parquet here instead of '
+                        'PostgreSQL (needs pyarrow)',
+                        metavar='dir',
+                        type=str)
+
+    parser.add_argument('-f',
+                        '--full',
+                        help='Re-ingest every file, ignoring the manifest',
+                        action='store_true')
+
+    parser.add_argument('-r',
+                        '--report',
+                        help='Console output: nothing, a summary line or '
+                        'every vehicle as a table',
+                        choices=REPORT_MODES,
+                        default='summary')
+
+    parser.add_argument('-n',
+                        '--dry_run',
+                        help='Parse only, do not store',
+                        action='store_true')
+
+    stage_metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.quote_key:
+        from quote_params import QUOTE_KEY_FILE, load_quote_key
+
+        args.quote_key = load_quote_key(args.directory)
+        if args.quote_key is None and args.table == 'vehicle_fares':
+            parser.error(f'--table vehicle_fares needs --quote_key or a '
+                         f'{QUOTE_KEY_FILE} in "{args.directory}"')
+
+    return args
+
+
+def list_html_files(directory):
+    """Sorted paths of the HTML files in a directory"""
+    return [
+        os.path.join(directory, filename)
+        for filename in sorted(os.listdir(directory))
+        if filename.endswith('.html')  # Process only HTML files
+    ]
+
+
+def page_number(file_path):
+    """Result page number from a page_N.html name, None otherwise"""
+    match = _PAGE_NO.search(file_path)
+    return int(match.group(1)) if match else None
+
+
+def parse_file_safe(task):
+    """Worker entry point: parse one file, trapping its errors.
+
+    Returns (file_path, vehicles, error, seconds); the time travels back
+    with the result since worker processes keep their own metrics.
+    """
+    file_path, engine = task
+    start = time.perf_counter()
+    try:
+        vehicles = parse_html_file(file_path, engine)
+    except Exception as error:
+        return (file_path, [], f'{type(error).__name__}: {error}',
+                time.perf_counter() - start)
+
+    page_no = page_number(file_path)
+    for vehicle in vehicles:
+        vehicle['Page_No'] = page_no
+    return file_path, vehicles, None, time.perf_counter() - start
+
+
+def iter_parsed_files(file_paths, workers=None, chunk_size=16,
+                      engine=DEFAULT_ENGINE):
+    """Yield (file_path, vehicles, error, seconds) per file, in input
+    order"""
+    tasks = [(file_path, engine) for file_path in file_paths]
+    if workers == 1:
+        yield from map(parse_file_safe, tasks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(parse_file_safe, tasks,
+                                chunksize=max(1, chunk_size))
+
+
+def ingest_directory(directory, store=None, workers=None, chunk_size=16,
+                     engine=DEFAULT_ENGINE, manifest=None, report=None):
+    """Parse every page in a directory and hand each file's vehicles to store.
+
+    With a manifest, files it already holds are skipped before parsing and
+    each stored file is queued on it. report(file_path, vehicles), e.g. a
+    VehicleReporter, sees each parsed file after it is stored.
+    """
+    file_paths = list_html_files(directory)
+    if manifest is not None:
+        file_paths = [f for f in file_paths if manifest.is_new(f)]
+
+    parsed = failed = vehicles_total = 0
+    for file_path, vehicles, error, seconds in iter_parsed_files(
+            file_paths, workers, chunk_size, engine):
+        stage_metrics.METRICS.observe('ingest_file_seconds', seconds,
+                                      engine=engine)
+        if error:
+            failed += 1
+            print(f"Could not parse {file_path}: {error}")
+            continue
+
+        parsed += 1
+        vehicles_total += len(vehicles)
+        if store is not None:
+            store(vehicles)
+        if manifest is not None:
+            manifest.mark_loaded(file_path, len(vehicles))
+        if report is not None:
+            report(file_path, vehicles)
+
+    return parsed, failed, vehicles_total
+
+
+def open_writer(table, batch_size, quote_key=None):
+    """Batched writer for the target table, schema brought up to date.
+
+    vehicle_fares gets a FareHistory storing every vehicle written as a
+    snapshot of quote_key, which is then required. vehicle_quotes rows
+    are keyed by quote_key, or '' when it is not known.
+    """
+    import spider_db
+    from migrate import migrate
+    from vehicle_store import VehicleWriter
+
+    if table == 'vehicle_data':
+        writer = spider_db.open_writer(batch_size)
+    elif table == 'vehicle_fares':
+        from fare_history import FareHistory
+
+        if not quote_key:
+            raise ValueError('vehicle_fares needs the quote key of the pages')
+        writer = FareHistory.connect(spider_db.DB_CONFIG,
+                                     key=lambda record: quote_key)
+    else:
+        writer = VehicleWriter.connect_quotes(spider_db.DB_CONFIG,
+                                              quote_key or '',
+                                              batch_size=batch_size)
+    migrate(writer.connection)
+    return writer
+
+
+# --------------------------------------------------
+def run(args, report=None):
+    """Ingest args.directory into the sink the arguments pick;
+    returns (parsed, failed, vehicles_total)"""
+    if args.dry_run:
+        return ingest_directory(args.directory, None, args.workers,
+                                args.chunk_size, args.engine, report=report)
+
+    if args.parquet_dir:
+        from parquet_store import ParquetSink
+
+        with ParquetSink(args.parquet_dir, args.batch_size) as sink:
+            return ingest_directory(args.directory, sink.write, args.workers,
+                                    args.chunk_size, args.engine,
+                                    report=report)
+
+    from ingest_manifest import IngestManifest
+
+    # A fare snapshot needs every page of its quote, skipped ones included
+    full = args.full or args.table == 'vehicle_fares'
+    with open_writer(args.table, args.batch_size,
+                     args.quote_key) as writer:
+        manifest = None if full else IngestManifest(writer.connection)
+        counts = ingest_directory(args.directory, writer.write, args.workers,
+                                  args.chunk_size, args.engine, manifest,
+                                  report)
+        if args.table == 'vehicle_fares':
+            from quote_params import load_quote_key
+
+            # the spider saves quote_key.txt once every page is saved
+            if counts[1] == 0 and load_quote_key(args.directory):
+                writer.mark_complete(args.quote_key)
+        # Rows first, so the manifest never lists unstored pages
+        writer.flush()
+        if manifest is not None:
+            manifest.save()
+        if args.table == 'vehicle_fares' and args.report != 'quiet':
+            print(' '.join(f'{key}={value}'
+                           for key, value in writer.stats.items()))
+    return counts
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    report = VehicleReporter(args.report)
+
+    with stage_metrics.instrumented(args):
+        parsed, failed, vehicles_total = run(args, report)
+    if args.report != 'quiet':
+        print(f'Parsed {parsed} files ({vehicles_total} vehicles), '
+              f'{failed} failed in '
+              f'{time.perf_counter() - report.started:.2f}s')
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
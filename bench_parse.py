@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-02
+Purpose: Parity check and benchmark for the vehicle parse engines
+"""
+import argparse
+import glob
+import sys
+import time
+import tracemalloc
+
+import vehicle_parser
+
+# Expanded rate details, spliced into the fixtures so the rate table path
+# is exercised (the saved pages were captured with the details collapsed)
+RATE_ROWS = ('<tbody>'
+             '<tr class="child"><th>Flat Rate</th><td>$95.00</td></tr>'
+             '<tr class="child"><th>Std Grat(20.00%)</th><td>$19.00</td></tr>'
+             '<tr class="child"><th>GA State Taxes(7.00%)</th><td>$6.65</td></tr>'
+             '</tbody>')
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Parse engine parity check and benchmark',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('files',
+                        metavar='file',
+                        nargs='*',
+                        default=sorted(glob.glob('Data/page_*.html')),
+                        help='Saved booking pages')
+
+    parser.add_argument('-e',
+                        '--engines',
+                        metavar='engine',
+                        nargs='+',
+                        choices=vehicle_parser.ENGINES,
+                        default=list(vehicle_parser.ENGINES),
+                        help='Engines to compare')
+
+    parser.add_argument('-n',
+                        '--repeat',
+                        metavar='int',
+                        type=int,
+                        default=20,
+                        help='Parses per page and engine')
+
+    return parser.parse_args()
+
+
+def load_pages(files):
+    """Read every page plus a variant with the rate details expanded"""
+    pages = []
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        pages.append((file_path, content))
+        pages.append((f'{file_path} (rates)',
+                      content.replace('<tbody></tbody>', RATE_ROWS)))
+    return pages
+
+
+def check_parity(pages, engines):
+    """Compare every engine against the BeautifulSoup reference"""
+    ok = True
+    for name, content in pages:
+        expected = vehicle_parser.parse_html(content, 'soup')
+        for engine in engines:
+            if vehicle_parser.parse_html(content, engine) != expected:
+                print(f'MISMATCH {engine}: {name}')
+                ok = False
+    return ok
+
+
+def time_engine(pages, engine, repeat):
+    """Mean seconds per page for one engine"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, content in pages:
+            vehicle_parser.parse_html(content, engine)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+def time_files(files, engine, repeat):
+    """Mean seconds per page for parse_html_file, reading included"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for file_path in files:
+            vehicle_parser.parse_html_file(file_path, engine)
+    return (time.perf_counter() - start) / (repeat * len(files))
+
+
+def peak_memory(pages, engine):
+    """Largest Python heap peak over single page parses, in KiB.
+
+    tracemalloc only sees Python allocations, so the lxml engines' C trees
+    are not counted; the soup engines are measured in full.
+    """
+    peak = 0
+    # imports happen on the first parse and are not part of the cost
+    vehicle_parser.parse_html(pages[0][1], engine)
+    for _, content in pages:
+        tracemalloc.start()
+        vehicle_parser.parse_html(content, engine)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak / 1024
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    if not args.files:
+        sys.exit('No pages to benchmark')
+
+    pages = load_pages(args.files)
+    engines = [e for e in args.engines if e != 'soup']
+    if not check_parity(pages, engines):
+        sys.exit('Parse engines disagree with the BeautifulSoup reference')
+    print(f'Parity OK: {", ".join(engines)} match soup on {len(pages)} pages')
+
+    baseline = time_engine(pages, 'soup', args.repeat)
+    print(f'{"engine":<15}{"ms/page":>10}{"speedup":>10}{"file ms":>10}'
+          f'{"py KiB":>10}')
+    for engine in ['soup'] + engines:
+        elapsed = (baseline if engine == 'soup' else
+                   time_engine(pages, engine, args.repeat))
+        file_elapsed = time_files(args.files, engine, args.repeat)
+        print(f'{engine:<15}{elapsed * 1000:>10.2f}'
+              f'{baseline / elapsed:>9.1f}x{file_elapsed * 1000:>10.2f}'
+              f'{peak_memory(pages, engine):>10.0f}')
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
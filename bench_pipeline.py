@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-08-02
+Purpose: Throughput and memory benchmarks for parse, normalize and store
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+import vehicle_parser
+from synth_pages import TEMPLATE_PAGE, PageSynthesizer
+from vehicle_normalize import VehicleRecord, normalize_vehicle
+
+
+class NullConnection:
+    """Stands in for a psycopg2 connection: COPY data is read and dropped,
+    so a writer benchmark measures row building and CSV encoding only"""
+
+    def __init__(self):
+        self.bytes_copied = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        pass
+
+    def copy_expert(self, query, buffer):
+        self.bytes_copied += len(buffer.read())
+
+    def close(self):
+        pass
+
+
+def measure(func, repeat):
+    """(best seconds per call, peak traced KiB of one call)"""
+    func()  # warm up imports and caches
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak / 1024
+
+
+def parse_benchmarks(pages, engines):
+    """(name, items, func) parsing every page with each engine"""
+    for engine in engines:
+        yield (f'parse[{engine}]', len(pages),
+               lambda engine=engine: [vehicle_parser.parse_html(page, engine)
+                                      for page in pages])
+
+
+def record_benchmarks(vehicles):
+    """(name, items, func) turning parsed dicts into typed rows"""
+    yield ('normalize', len(vehicles),
+           lambda: [normalize_vehicle(vehicle) for vehicle in vehicles])
+    yield ('record', len(vehicles),
+           lambda: [VehicleRecord.from_vehicle(vehicle)
+                    for vehicle in vehicles])
+
+
+def store_benchmarks(vehicles, db_config=None):
+    """(name, items, func) writing vehicles through VehicleWriter"""
+    from vehicle_store import QUOTE_COLUMNS, VehicleWriter, quote_row
+
+    def write(connection, method):
+        writer = VehicleWriter(connection, table='bench_vehicle_quotes',
+                               columns=QUOTE_COLUMNS, batch_size=1000,
+                               method=method, release=lambda c: None,
+                               normalize=quote_row, missing=None)
+        writer.write(vehicles)
+        writer.flush()
+
+    yield ('store[copy, null]', len(vehicles),
+           lambda: write(NullConnection(), 'copy'))
+    if db_config is None:
+        return
+
+    import psycopg2
+
+    connection = psycopg2.connect(**db_config)
+    with connection, connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE bench_vehicle_quotes ('
+            'vehicle_type TEXT, vehicle_model TEXT, price_cents BIGINT, '
+            'passenger_no INTEGER, luggage_no INTEGER, pickup_at TIMESTAMP, '
+            'pickup_location TEXT, dropoff_location TEXT, '
+            'flat_rate_cents BIGINT, gratuity_cents BIGINT, '
+            'tax_cents BIGINT, page_no INTEGER, quote_key TEXT, '
+            'listing_no INTEGER)')
+    for method in ('copy', 'values'):
+        yield (f'store[{method}, postgres]', len(vehicles),
+               lambda method=method: write(connection, method))
+
+
+def run_size(vehicles_per_page, pages, args):
+    """Results of every benchmark on one synthetic quote size"""
+    synthesizer = PageSynthesizer(args.template, rates=True)
+    contents = synthesizer.quote(vehicles_per_page, pages)
+    vehicles = [vehicle for content in contents
+                for vehicle in vehicle_parser.parse_html(content)]
+
+    benchmarks = list(parse_benchmarks(contents, args.engines))
+    benchmarks.extend(record_benchmarks(vehicles))
+    db_config = None
+    if args.db:
+        from spider_db import DB_CONFIG
+        db_config = DB_CONFIG
+    benchmarks.extend(store_benchmarks(vehicles, db_config))
+
+    results = []
+    for name, items, func in benchmarks:
+        seconds, peak = measure(func, args.repeat)
+        results.append({
+            'name': name,
+            'vehicles_per_page': vehicles_per_page,
+            'pages': pages,
+            'vehicles': len(vehicles),
+            'ms': round(seconds * 1000, 3),
+            'us_per_vehicle': round(seconds * 1e6 / max(1, len(vehicles)), 2),
+            'items_per_s': round(items / seconds, 1),
+            'peak_kib': round(peak, 1),
+        })
+    return results
+
+
+def key(result):
+    return (result['name'], result['vehicles_per_page'], result['pages'])
+
+
+def regressions(results, baseline, tolerance):
+    """Results slower or hungrier than the baseline by more than tolerance"""
+    previous = {key(result): result for result in baseline}
+    found = []
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        for metric in ('ms', 'peak_kib'):
+            if old[metric] and result[metric] > old[metric] * (1 + tolerance):
+                found.append((result, metric, old[metric]))
+    return found
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Parse, normalize and store benchmarks on synthetic '
+        'pages',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-v',
+                        '--vehicles',
+                        help='Vehicles per page, one run per value',
+                        metavar='int',
+                        nargs='+',
+                        type=int,
+                        default=[8, 64, 256])
+
+    parser.add_argument('-p',
+                        '--pages',
+                        help='Result pages per run',
+                        metavar='int',
+                        type=int,
+                        default=3)
+
+    parser.add_argument('-e',
+                        '--engines',
+                        metavar='engine',
+                        nargs='+',
+                        choices=vehicle_parser.ENGINES,
+                        default=['lxml', 'selectolax', 'lxml_stream'],
+                        help='Parse engines to time')
+
+    parser.add_argument('-n',
+                        '--repeat',
+                        help='Timed runs per benchmark (best is kept)',
+                        metavar='int',
+                        type=int,
+                        default=5)
+
+    parser.add_argument('--template',
+                        help='Saved page the synthetic pages build on',
+                        metavar='file',
+                        default=TEMPLATE_PAGE)
+
+    parser.add_argument('--db',
+                        help='Also time writes to PostgreSQL (spider_db '
+                        'settings, temporary table)',
+                        action='store_true')
+
+    parser.add_argument('-o',
+                        '--output',
+                        help='Save the results as JSON',
+                        metavar='file')
+
+    parser.add_argument('-b',
+                        '--baseline',
+                        help='Earlier --output to compare against',
+                        metavar='file')
+
+    parser.add_argument('-t',
+                        '--tolerance',
+                        help='Allowed slowdown or memory growth vs baseline',
+                        metavar='float',
+                        type=float,
+                        default=0.2)
+
+    return parser.parse_args()
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+
+    results = []
+    print(f'{"benchmark":<24}{"veh/page":>9}{"ms":>10}{"us/veh":>9}'
+          f'{"items/s":>11}{"peak KiB":>10}')
+    for vehicles_per_page in args.vehicles:
+        for result in run_size(vehicles_per_page, args.pages, args):
+            results.append(result)
+            print(f'{result["name"]:<24}{vehicles_per_page:>9}'
+                  f'{result["ms"]:>10.2f}{result["us_per_vehicle"]:>9.1f}'
+                  f'{result["items_per_s"]:>11.0f}{result["peak_kib"]:>10.0f}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            found = regressions(results, json.load(file), args.tolerance)
+        for result, metric, old in found:
+            print(f'REGRESSION {result["name"]} @ '
+                  f'{result["vehicles_per_page"]} vehicles/page: {metric} '
+                  f'{old} -> {result[metric]}')
+        if found:
+            sys.exit(1)
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
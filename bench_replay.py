@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-08-12
+Purpose: Offline load test of the crawl paths over recorded pages
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stage_metrics import METRICS
+from stub_server import Faults
+
+MODES = ('http', 'driver')
+
+
+def quote_jobs(count):
+    """(job_id, args) pairs with the spider defaults on distinct dates"""
+    from mayslimo_spider import quote_defaults
+
+    first = datetime.date(2024, 6, 1)
+    jobs = []
+    for job_id in range(count):
+        args = quote_defaults()
+        args.date = (first + datetime.timedelta(days=job_id)).strftime(
+            '%m/%d/%Y')
+        jobs.append((job_id, args))
+    return jobs
+
+
+def histograms(*names):
+    """Summaries of the named METRICS histograms, by label"""
+    return {
+        entry['name'] + ''.join(f'[{value}]'
+                                for value in entry['labels'].values()): {
+            key: entry[key] for key in ('count', 'mean', 'p50', 'p95')}
+        for entry in METRICS.as_dict()['histograms']
+        if entry['name'] in names
+    }
+
+
+def run_http(args, faults):
+    """AsyncCrawler over the stub server; returns a result dict"""
+    from async_crawl import AsyncCrawler
+    from stub_server import start_stub_server
+
+    server, base_url = start_stub_server(args.directory, 0, faults)
+    crawler = AsyncCrawler(base_url=base_url, concurrency=args.concurrency,
+                           rate=args.rate, max_retries=args.retries,
+                           backoff=args.backoff)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = asyncio.run(crawler.run(quote_jobs(args.jobs)))
+    finally:
+        server.shutdown()
+    return {'mode': 'http', **stats, 'requests': server.requests,
+            'latency': histograms('fetch_seconds')}
+
+
+def replay_quote(pages, faults, capture, timeout):
+    """Pages captured and vehicles parsed from one replayed quote"""
+    from mayslimo_spider import click_next_until_disabled, set_timeouts
+    from replay_driver import ReplayDriver
+    from vehicle_parser import parse_html
+
+    driver = ReplayDriver(pages, faults)
+    set_timeouts(driver, timeout, timeout)
+    captured = []
+    try:
+        click_next_until_disabled(
+            driver, capture=capture,
+            on_page=lambda page_no, source: captured.append(
+                len(parse_html(source))))
+    except Exception:
+        # an incomplete quote shows in the counts
+        pass
+    return len(captured), sum(captured)
+
+
+def run_driver(args, faults):
+    """click_next_until_disabled on replay drivers in a thread pool"""
+    from replay_driver import ReplayDriver
+
+    pages = ReplayDriver.from_directory(args.directory).pages
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), \
+            ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(
+            lambda _: replay_quote(pages, faults, args.capture,
+                                   args.timeout),
+            range(args.jobs)))
+    elapsed = time.perf_counter() - start
+    return {
+        'mode': 'driver',
+        'capture': args.capture,
+        'quotes': len(results),
+        'complete': sum(captured == len(pages) for captured, _ in results),
+        'pages': sum(captured for captured, _ in results),
+        'records': sum(vehicles for _, vehicles in results),
+        'failures': faults.failures,
+        'elapsed': round(elapsed, 3),
+        'quotes_per_s': round(len(results) / elapsed, 2),
+        'steps': histograms('crawl_step_seconds'),
+    }
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Load-test the HTTP crawler and the Selenium capture '
+        'loop against recorded pages, with injected latency and failures',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('directory',
+                        metavar='dir',
+                        nargs='?',
+                        default='Data',
+                        help='Recorded page_N.html files of one quote')
+
+    parser.add_argument('-m',
+                        '--modes',
+                        metavar='mode',
+                        nargs='+',
+                        choices=MODES,
+                        default=list(MODES),
+                        help='http: async_crawl over stub_server; driver: '
+                        'click_next_until_disabled over ReplayDriver')
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        help='Quotes to crawl',
+                        metavar='int',
+                        type=int,
+                        default=200)
+
+    parser.add_argument('-c',
+                        '--concurrency',
+                        help='Fetches in flight (http) or driver threads',
+                        metavar='int',
+                        type=int,
+                        default=32)
+
+    parser.add_argument('--rate',
+                        help='Requests/s of the http token bucket',
+                        metavar='float',
+                        type=float,
+                        default=1000.0)
+
+    parser.add_argument('--retries',
+                        help='Retries per page fetch',
+                        metavar='int',
+                        type=int,
+                        default=3)
+
+    parser.add_argument('--backoff',
+                        help='First retry delay in seconds',
+                        metavar='float',
+                        type=float,
+                        default=0.05)
+
+    parser.add_argument('--capture',
+                        help='Capture mode of the driver run',
+                        choices=['script', 'clicks'],
+                        default='script')
+
+    parser.add_argument('--timeout',
+                        help='Wait timeout of the driver run',
+                        metavar='float',
+                        type=float,
+                        default=5.0)
+
+    parser.add_argument('--latency',
+                        help='Seconds per response or page update',
+                        metavar='float',
+                        type=float,
+                        default=0.05)
+
+    parser.add_argument('--jitter',
+                        help='Up to this many more seconds, at random',
+                        metavar='float',
+                        type=float,
+                        default=0.05)
+
+    parser.add_argument('--failure_rate',
+                        help='Share of requests or clicks that fail',
+                        metavar='float',
+                        type=float,
+                        default=0.02)
+
+    parser.add_argument('--seed',
+                        help='Random seed for latency and failures',
+                        metavar='int',
+                        type=int,
+                        default=0)
+
+    parser.add_argument('-o',
+                        '--output',
+                        help='Save the results as JSON',
+                        metavar='file')
+
+    return parser.parse_args()
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+
+    results = []
+    for mode in args.modes:
+        METRICS.reset()
+        faults = Faults(args.latency, args.jitter, args.failure_rate,
+                        args.seed)
+        result = (run_http if mode == 'http' else run_driver)(args, faults)
+        results.append(result)
+        print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-08-08
+Purpose: Startup time of the command-line scripts and the modules they load
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# (name, argv) of commands that must start without a browser or database
+COMMANDS = (
+    ('spider --help', ['mayslimo_spider.py', '--help']),
+    ('fare_sweep --help', ['fare_sweep.py', '--help']),
+    ('crawl_jobs --help', ['crawl_jobs.py', '--help']),
+    ('async_crawl --help', ['async_crawl.py', '--help']),
+    ('pipeline --help', ['pipeline.py', '--help']),
+    ('http_quote --help', ['http_quote.py', '--help']),
+    ('batch_ingest --help', ['batch_ingest.py', '--help']),
+    ('soup_postgres_store --help', ['soup_postgres_store.py', '--help']),
+    ('batch_ingest dry run', ['batch_ingest.py', 'Data', '--dry_run',
+                              '--workers', '1', '--report', 'quiet']),
+)
+
+# Packages that only a crawl or a database write needs
+HEAVY_MODULES = ('selenium.webdriver.remote', 'bs4', 'psycopg2', 'requests',
+                 'pyarrow', 'zstandard')
+
+
+def run_once(argv, env=None):
+    """Wall seconds of one run of a script"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + argv, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=True, env=env)
+    return time.perf_counter() - start
+
+
+def heavy_imports(argv):
+    """HEAVY_MODULES a run imports, from its -X importtime trace"""
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + argv,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, check=True)
+    loaded = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and line.count('|') == 2:
+            module = line.rsplit('|', 1)[1].strip()
+            loaded.update(name for name in HEAVY_MODULES
+                          if module == name or module.startswith(name + '.'))
+    return sorted(loaded)
+
+
+def baseline_ms(repeat):
+    """Best time of a bare interpreter, subtracted from every command"""
+    return min(run_once(['-c', 'pass']) for _ in range(repeat)) * 1000
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Startup time of --help and parse-only commands',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-n',
+                        '--repeat',
+                        help='Runs per command (best is kept)',
+                        metavar='int',
+                        type=int,
+                        default=5)
+
+    parser.add_argument('-m',
+                        '--max_ms',
+                        help='Fail if a command takes longer than this over '
+                        'a bare interpreter, or imports a heavy module',
+                        metavar='float',
+                        type=float)
+
+    parser.add_argument('-o',
+                        '--output',
+                        help='Save the results as JSON',
+                        metavar='file')
+
+    return parser.parse_args()
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    python_ms = baseline_ms(args.repeat)
+    print(f'bare interpreter: {python_ms:.0f} ms')
+    print(f'{"command":<30}{"ms":>8}{"+ms":>8}  heavy imports')
+    results = []
+    for name, argv in COMMANDS:
+        ms = min(run_once(argv) for _ in range(args.repeat)) * 1000
+        heavy = heavy_imports(argv)
+        results.append({'name': name, 'ms': round(ms, 1),
+                        'over_python_ms': round(ms - python_ms, 1),
+                        'heavy_imports': heavy})
+        print(f'{name:<30}{ms:>8.0f}{ms - python_ms:>8.0f}  '
+              f'{", ".join(heavy) or "-"}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    if args.max_ms is not None:
+        slow = [result for result in results
+                if result['over_python_ms'] > args.max_ms or
+                result['heavy_imports']]
+        for result in slow:
+            print(f'SLOW {result["name"]}: +{result["over_python_ms"]} ms, '
+                  f'imports {result["heavy_imports"]}')
+        if slow:
+            sys.exit(1)
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-15
+Purpose: Run a batch of quotes across a pool of headless browser workers
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+from vehicle_parser import DATA_DIR
+
+# Quote fields given as on/off flags on the mayslimo_spider command line
+FLAG_FIELDS = ('add_stop', 'bool_rtn_loc')
+TRUE_STRINGS = ('1', 'true', 'yes', 'y')
+# How often the parent checks that workers are alive while waiting
+RESULT_POLL_SECONDS = 5
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Parallel quote crawler',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('jobs',
+                        metavar='file',
+                        help='Quote parameter sets, .csv or .jsonl, with '
+                        'columns named like the mayslimo_spider options '
+                        '(date, time, pickup_location_str, ...)')
+
+    parser.add_argument('-w',
+                        '--workers',
+                        help='Browser workers',
+                        metavar='int',
+                        type=int,
+                        default=4)
+
+    parser.add_argument('-r',
+                        '--retries',
+                        help='Extra attempts for a failed quote',
+                        metavar='int',
+                        type=int,
+                        default=2)
+
+    parser.add_argument('-o',
+                        '--out_dir',
+                        help='Root directory for the worker outputs',
+                        metavar='dir',
+                        type=str,
+                        default=DATA_DIR)
+
+    parser.add_argument('--show_browser',
+                        help='Run Chrome with a window',
+                        action='store_true')
+
+    return parser.parse_args()
+
+
+def read_jobs(file_path):
+    """Job dicts from a CSV or JSON-lines file, blank values dropped"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        if file_path.endswith('.csv'):
+            rows = list(csv.DictReader(file))
+        else:
+            rows = [json.loads(line) for line in file if line.strip()]
+
+    jobs = []
+    for index, row in enumerate(rows):
+        job = {k: v for k, v in row.items() if v not in (None, '')}
+        job.setdefault('job_id', str(index))
+        jobs.append(job)
+    return jobs
+
+
+def job_args(job):
+    """Quote parameters for a job, validated by the spider's own parser;
+    ValueError for a row the parser rejects"""
+    from mayslimo_spider import get_args as spider_args
+
+    argv = []
+    for field, value in job.items():
+        if field == 'job_id':
+            continue
+        if field in FLAG_FIELDS:
+            if value is True or str(value).lower() in TRUE_STRINGS:
+                argv.append(f'--{field}')
+        else:
+            argv.extend([f'--{field}', str(value)])
+    try:
+        return spider_args(argv)
+    except SystemExit:
+        # argparse has printed the reason; do not let it end the process
+        raise ValueError(f"Invalid job {job.get('job_id')}: {argv}") from None
+
+
+def failed_result(job_id, error):
+    """Result of a job that never ran to completion in a worker"""
+    return {
+        'job_id': job_id,
+        'worker': None,
+        'ok': False,
+        'attempts': 0,
+        'seconds': 0.0,
+        'directory': None,
+        'error': error,
+    }
+
+
+def run_worker(worker_id, jobs, results, out_dir, retries, headless):
+    """Worker process: one driver reused for every job it pulls"""
+    from crawl_timing import StepTimer
+    from mayslimo_spider import make_driver, run_quote
+
+    worker_dir = os.path.join(out_dir, f'worker_{worker_id}')
+    os.makedirs(worker_dir, exist_ok=True)
+    timing_log = os.path.join(worker_dir, 'timing.jsonl')
+    driver = None
+    try:
+        for job in iter(jobs.get, None):
+            job_dir = os.path.join(worker_dir, f"job_{job['job_id']}")
+            start = time.perf_counter()
+            error = None
+            for attempt in range(1, retries + 2):
+                try:
+                    if driver is None:
+                        driver = make_driver(headless)
+                    timer = StepTimer(timing_log, worker=worker_id,
+                                      job_id=job['job_id'], attempt=attempt)
+                    run_quote(driver, job_args(job), job_dir, timer)
+                    error = None
+                    break
+                except Exception as ex:
+                    error = f'{type(ex).__name__}: {ex}'
+                    # The session may be dead; start a fresh one next attempt
+                    if driver is not None:
+                        try:
+                            driver.quit()
+                        except Exception:
+                            pass
+                        driver = None
+
+            results.put({
+                'job_id': job['job_id'],
+                'worker': worker_id,
+                'ok': error is None,
+                'attempts': attempt,
+                'seconds': round(time.perf_counter() - start, 3),
+                'directory': job_dir,
+                'error': error,
+            })
+    finally:
+        if driver is not None:
+            driver.quit()
+
+
+def run_jobs(jobs, workers=4, out_dir=DATA_DIR, retries=2, headless=True):
+    """Spread jobs over browser workers, yielding one result per job.
+
+    Rows the spider's parser rejects fail here, before any browser starts.
+    Jobs still unanswered once every worker has exited (a crash, or a
+    killed browser process) are reported as failed.
+    """
+    valid = []
+    for job in jobs:
+        try:
+            job_args(job)
+        except ValueError as error:
+            yield failed_result(job['job_id'], str(error))
+        else:
+            valid.append(job)
+    jobs = valid
+    if not jobs:
+        return
+
+    job_queue = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    for job in jobs:
+        job_queue.put(job)
+
+    workers = max(1, min(workers, len(jobs)))
+    processes = [
+        multiprocessing.Process(target=run_worker,
+                                args=(worker_id, job_queue, results, out_dir,
+                                      retries, headless))
+        for worker_id in range(workers)
+    ]
+    for _ in processes:
+        job_queue.put(None)
+    for process in processes:
+        process.start()
+
+    pending = {}
+    for job in jobs:
+        pending[job['job_id']] = pending.get(job['job_id'], 0) + 1
+    try:
+        while pending:
+            try:
+                result = results.get(timeout=RESULT_POLL_SECONDS)
+            except queue.Empty:
+                if any(process.is_alive() for process in processes):
+                    continue
+                break
+            pending[result['job_id']] -= 1
+            if not pending[result['job_id']]:
+                del pending[result['job_id']]
+            yield result
+        for job_id, count in pending.items():
+            for _ in range(count):
+                yield failed_result(job_id,
+                                    'Worker exited without a result')
+    finally:
+        for process in processes:
+            process.join()
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    jobs = read_jobs(args.jobs)
+
+    ok = failed = 0
+    for result in run_jobs(jobs, args.workers, args.out_dir, args.retries,
+                           not args.show_browser):
+        if result['ok']:
+            ok += 1
+            print(f"Job {result['job_id']}: saved to {result['directory']} "
+                  f"in {result['seconds']}s")
+        else:
+            failed += 1
+            print(f"Job {result['job_id']}: failed after "
+                  f"{result['attempts']} attempts: {result['error']}")
+
+    print(f'{ok} quotes crawled, {failed} failed')
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-17
+Purpose: Per-step latency log for crawl runs
+"""
+import json
+import time
+from contextlib import contextmanager
+
+from stage_metrics import METRICS
+
+
+class StepTimer:
+    """Records how long each crawl step takes.
+
+    Every step becomes one record {step, seconds, ok, started_at, ...}
+    kept in memory and, when path is given, appended to a JSON-lines log.
+    Extra keyword arguments (page number, quote id) are stored with it.
+    Steps also feed the crawl_step_seconds histogram of stage_metrics.
+    """
+
+    def __init__(self, path=None, **context):
+        self.path = path
+        self.context = context
+        self.records = []
+
+    @contextmanager
+    def step(self, name, **extra):
+        """Time the body of a with block as one step"""
+        started_at = time.time()
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(name, time.perf_counter() - start, ok, started_at,
+                        **extra)
+
+    def record(self, name, seconds, ok=True, started_at=None, **extra):
+        """Add one step record"""
+        entry = {
+            'step': name,
+            'seconds': round(seconds, 4),
+            'ok': ok,
+            'started_at': started_at if started_at is not None else
+            time.time() - seconds,
+            **self.context,
+            **extra,
+        }
+        self.records.append(entry)
+        METRICS.observe('crawl_step_seconds', seconds, step=name)
+        if not ok:
+            METRICS.inc('crawl_step_errors', step=name)
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry) + '\n')
+
+    def summary(self):
+        """Total seconds and count per step name"""
+        totals = {}
+        for entry in self.records:
+            total = totals.setdefault(entry['step'], {'count': 0,
+                                                      'seconds': 0.0})
+            total['count'] += 1
+            total['seconds'] += entry['seconds']
+        return totals
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-08-09
+Purpose: Store only fare changes between crawl snapshots (SCD type 2)
+"""
+from datetime import datetime
+
+from stage_metrics import METRICS
+from vehicle_normalize import VehicleRecord
+
+# A change in any of these starts a new version of a vehicle's fare
+VERSION_FIELDS = ('price_cents', 'flat_rate_cents', 'gratuity_cents',
+                  'tax_cents', 'passenger_no', 'luggage_no')
+
+# vehicle_fares columns written from each record, after quote_key
+FARE_COLUMNS = ('vehicle_type', 'vehicle_model', 'price_cents',
+                'passenger_no', 'luggage_no', 'pickup_at', 'pickup_location',
+                'dropoff_location', 'flat_rate_cents', 'gratuity_cents',
+                'tax_cents')
+
+CURRENT_QUERY = f'''
+SELECT quote_key, vehicle_type, vehicle_model, listing_no,
+       {', '.join(VERSION_FIELDS)}
+FROM vehicle_fares
+WHERE valid_to IS NULL AND quote_key = ANY(%s)
+'''
+
+CLOSE_QUERY = '''
+UPDATE vehicle_fares AS f SET valid_to = v.valid_to
+FROM (VALUES %s)
+    AS v (quote_key, vehicle_type, vehicle_model, listing_no, valid_to)
+WHERE f.valid_to IS NULL AND f.quote_key = v.quote_key
+  AND f.vehicle_type = v.vehicle_type AND f.vehicle_model = v.vehicle_model
+  AND f.listing_no = v.listing_no
+'''
+
+INSERT_QUERY = f'''
+INSERT INTO vehicle_fares (quote_key, vehicle_type, vehicle_model, listing_no,
+                           {', '.join(FARE_COLUMNS[2:])}, valid_from)
+VALUES %s
+'''
+
+AS_OF_QUERY = f'''
+SELECT {', '.join(FARE_COLUMNS)}, listing_no, valid_from, valid_to
+FROM vehicle_fares
+WHERE quote_key = %s AND valid_from <= %s
+  AND (valid_to IS NULL OR valid_to > %s)
+ORDER BY vehicle_type, vehicle_model, listing_no
+'''
+
+
+def vehicle_id(record):
+    """(vehicle_type, vehicle_model) naming a vehicle within a quote"""
+    return record.vehicle_type or 'NA', record.vehicle_model or ''
+
+
+def fare_version(record):
+    """Values whose change makes a new fare version"""
+    return tuple(getattr(record, field) for field in VERSION_FIELDS)
+
+
+def _version_order(record):
+    return tuple((value is None, value or 0) for value in fare_version(record))
+
+
+def listings(records):
+    """(vehicle_type, vehicle_model, listing_no) -> record of a snapshot.
+
+    A vehicle listed more than once gets listing_no 0, 1, ... in order of
+    its fares, so the same listings on reordered pages compare equal.
+    """
+    grouped = {}
+    for record in records:
+        grouped.setdefault(vehicle_id(record), []).append(record)
+    return {key + (listing_no, ): record
+            for key, group in grouped.items()
+            for listing_no, record in enumerate(
+                sorted(group, key=_version_order))}
+
+
+def diff_snapshot(previous, records):
+    """(inserted, removed, changed) listing ids of a new snapshot.
+
+    previous maps listing id -> fare_version of the stored snapshot,
+    records maps listing id -> record of the new one, as from listings().
+    """
+    inserted = [key for key in records if key not in previous]
+    removed = [key for key in previous if key not in records]
+    changed = [key for key, record in records.items()
+               if key in previous and previous[key] != fare_version(record)]
+    return inserted, removed, changed
+
+
+class FareHistory:
+    """Writer for vehicle_fares that stores deltas instead of full quotes.
+
+    write() groups vehicles into one snapshot per key(record), the quote
+    key the caller derives for the pages it writes; flush()
+    compares each snapshot with the quote's current rows, read once per
+    quote through the partial index and kept in memory after that. Rows
+    of removed or re-priced vehicles get valid_to set, and new or
+    re-priced vehicles get a new row valid from the flush time, all in
+    one transaction. Unchanged vehicles cost no write at all.
+
+    Everything written between two flushes is one snapshot, so a quote's
+    pages must all be written before flush() is called. Only a snapshot
+    marked with mark_complete() closes the rows of vehicles it lacks; any
+    other may be missing pages, so its flush only opens and re-prices.
+    """
+
+    def __init__(self, connection, key, release=None, clock=datetime.now):
+        self.connection = connection
+        self.key = key
+        self.release = release or (lambda connection: connection.close())
+        self.clock = clock
+        self.pending = {}
+        self.complete = set()
+        self.current = {}
+        self.stats = {'quotes': 0, 'partial': 0, 'inserted': 0,
+                      'removed': 0, 'changed': 0, 'unchanged': 0}
+
+    @classmethod
+    def connect(cls, db_config, **kwargs):
+        """History writer with its own connection"""
+        import psycopg2
+
+        return cls(psycopg2.connect(**db_config), **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        self.close()
+
+    def write(self, vehicles):
+        """Add parsed vehicles to the pending snapshot of their quote"""
+        for vehicle in vehicles:
+            record = VehicleRecord.from_vehicle(vehicle)
+            self.pending.setdefault(self.key(record), []).append(record)
+
+    def mark_complete(self, quote_key):
+        """Declare that every page of a quote's pending snapshot was
+        written, so vehicles it lacks are no longer listed"""
+        self.complete.add(quote_key)
+
+    def load(self, quote_keys):
+        """Read the current rows of quotes not yet in memory"""
+        missing = [key for key in quote_keys if key not in self.current]
+        if not missing:
+            return
+        for key in missing:
+            self.current[key] = {}
+        with self.connection:
+            with self.connection.cursor() as cursor:
+                cursor.execute(CURRENT_QUERY, (missing, ))
+                for quote_key, vehicle_type, vehicle_model, listing_no, \
+                        *version in cursor.fetchall():
+                    self.current[quote_key][
+                        vehicle_type, vehicle_model, listing_no] = \
+                        tuple(version)
+
+    def flush(self):
+        """Write the changes of every pending snapshot as one transaction"""
+        if not self.pending:
+            return
+        pending = {quote_key: listings(records)
+                   for quote_key, records in self.pending.items()}
+        complete, self.complete = self.complete, set()
+        self.pending = {}
+        self.load(pending)
+        now = self.clock()
+        closed = []
+        opened = []
+        for quote_key, records in pending.items():
+            previous = self.current[quote_key]
+            inserted, removed, changed = diff_snapshot(previous, records)
+            if quote_key not in complete:
+                # vehicles on pages never captured are not gone
+                removed = []
+                self.stats['partial'] += 1
+            closed.extend((quote_key, ) + key + (now, )
+                          for key in removed + changed)
+            opened.extend(
+                (quote_key, ) + key +
+                tuple(getattr(records[key], column)
+                      for column in FARE_COLUMNS[2:]) + (now, )
+                for key in inserted + changed)
+            self.stats['quotes'] += 1
+            self.stats['inserted'] += len(inserted)
+            self.stats['removed'] += len(removed)
+            self.stats['changed'] += len(changed)
+            self.stats['unchanged'] += \
+                len(records) - len(inserted) - len(changed)
+
+        if closed or opened:
+            from psycopg2.extras import execute_values
+
+            with METRICS.time('store_flush_seconds', table='vehicle_fares',
+                              method='delta'), self.connection:
+                with self.connection.cursor() as cursor:
+                    if closed:
+                        execute_values(cursor, CLOSE_QUERY, closed,
+                                       page_size=len(closed))
+                    if opened:
+                        execute_values(cursor, INSERT_QUERY, opened,
+                                       page_size=len(opened))
+            METRICS.inc('rows_stored', len(opened), table='vehicle_fares')
+
+        # memory follows the database only once the transaction committed
+        for quote_key, records in pending.items():
+            versions = {key: fare_version(record)
+                        for key, record in records.items()}
+            if quote_key not in complete:
+                versions = {**self.current[quote_key], **versions}
+            self.current[quote_key] = versions
+
+    def close(self):
+        """Drop unflushed snapshots and release the connection"""
+        self.pending = {}
+        self.complete = set()
+        self.release(self.connection)
+
+
+def fares_as_of(connection, quote_key, at):
+    """Rows of a quote's fares as they were stored at a datetime"""
+    with connection:
+        with connection.cursor() as cursor:
+            cursor.execute(AS_OF_QUERY, (quote_key, at, at))
+            return cursor.fetchall()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-08-07
+Purpose: Sweep date, time, passengers and luggage over one loaded form
+"""
+import csv
+import datetime
+import itertools
+import sys
+import time
+
+import mayslimo_spider as spider
+import stage_metrics
+from crawl_timing import StepTimer
+from location_resolver import LocationResolver
+from selenium.webdriver.common.by import By
+from stage_metrics import METRICS
+from vehicle_parser import parse_html
+
+# Swept quote fields, outermost first, and the form setter of each. The
+# innermost field changes on every submission, the outer ones rarely.
+SWEEP_FIELDS = ('date', 'time', 'pass_num', 'luggage_num')
+FIELD_SETTERS = {
+    'date': spider.select_date,
+    'time': spider.select_time,
+    'pass_num': spider.no_passengers,
+    'luggage_num': spider.luggage_count,
+}
+EDIT_LINK_ID = 'wizardStep1EditLink'
+DATE_FORMAT = '%m/%d/%Y'
+
+
+def date_range(start, days):
+    """days consecutive mm/dd/yyyy dates from start"""
+    first = datetime.datetime.strptime(start, DATE_FORMAT)
+    return [(first + datetime.timedelta(days=offset)).strftime(DATE_FORMAT)
+            for offset in range(days)]
+
+
+def sweep_points(args):
+    """Every (date, time, pass_num, luggage_num) of the sweep, in the order
+    that changes the fewest form fields between submissions"""
+    dates = args.dates or date_range(args.date, args.days)
+    return list(itertools.product(dates, args.times or [args.time],
+                                  args.passengers or [args.pass_num],
+                                  args.luggage_counts or [args.luggage_num]))
+
+
+class FareSweep:
+    """Quotes many field combinations from one loaded booking form.
+
+    The page, frame, service and locations are set up once. Each point
+    then only rewrites the swept fields that differ from the last
+    submission, submits, captures the result pages in memory and goes
+    back to the form through the Step 1 Edit link. A point that fails
+    reloads the form from scratch before the next one.
+    """
+
+    def __init__(self, driver, args, resolver=None, timer=None):
+        self.driver = driver
+        self.args = args
+        self.resolver = resolver
+        self.timer = timer or StepTimer()
+        self.current = None
+        self.stats = {'quotes': 0, 'failed': 0, 'fields_set': 0,
+                      'reloads': 0}
+
+    def open_form(self):
+        """Load the booking page and fill in every field of args"""
+        with self.timer.step('page_load'):
+            self.driver.switch_to.default_content()
+            self.driver.get(self.args.url)
+            spider.switch_to_frame(self.driver)
+        with self.timer.step('form_fill'):
+            spider.fill_form(self.driver, self.args, self.resolver)
+        self.current = {field: getattr(self.args, field)
+                        for field in SWEEP_FIELDS}
+        self.stats['reloads'] += 1
+
+    def set_fields(self, point):
+        """Rewrite only the swept fields whose value changed"""
+        with self.timer.step('form_edit'):
+            for field, value in zip(SWEEP_FIELDS, point):
+                if self.current[field] != value:
+                    FIELD_SETTERS[field](self.driver, value)
+                    self.current[field] = value
+                    self.stats['fields_set'] += 1
+
+    def submit(self):
+        """Show rates and wait for a grid that replaced the previous one"""
+        driver = self.driver
+        with self.timer.step('rate_fetch'):
+            previous = driver.find_elements(By.CSS_SELECTOR,
+                                            spider.VEHICLE_ITEM_CSS)
+            spider.select_vehicle(driver)
+            if previous:
+                spider.get_wait(driver).until(
+                    spider._ec().staleness_of(previous[0]))
+            spider.wait_for_vehicle_grid(driver)
+
+    def back_to_form(self):
+        """Reopen Step 1 with the fields as they were submitted"""
+        with self.timer.step('form_return'):
+            spider.get_wait(self.driver).until(
+                spider._ec().element_to_be_clickable(
+                    (By.ID, EDIT_LINK_ID))).click()
+            spider.get_wait(self.driver).until(
+                spider._ec().visibility_of_element_located(
+                    (By.ID, 'PickUpDate')))
+
+    def quote(self, point):
+        """Vehicles of every result page for one sweep point"""
+        if self.current is None:
+            self.open_form()
+        else:
+            self.back_to_form()
+        self.set_fields(point)
+        self.submit()
+
+        vehicles = []
+
+        def on_page(page_num, source):
+            for vehicle in parse_html(source):
+                vehicle['Page_No'] = page_num
+                vehicles.append(vehicle)
+
+        spider.click_next_until_disabled(
+            self.driver, timer=self.timer, on_page=on_page,
+            capture=getattr(self.args, 'capture', 'script'))
+        return vehicles
+
+    def run(self, points):
+        """Yield (point, vehicles, seconds); vehicles is None on failure"""
+        for point in points:
+            start = time.perf_counter()
+            try:
+                vehicles = self.quote(point)
+            except Exception as ex:
+                print(f'{point}: {ex}', file=sys.stderr)
+                self.stats['failed'] += 1
+                METRICS.inc('sweep_quotes_failed')
+                self.current = None
+                vehicles = None
+            else:
+                self.stats['quotes'] += 1
+            seconds = time.perf_counter() - start
+            METRICS.observe('sweep_quote_seconds', seconds)
+            yield point, vehicles, seconds
+
+
+def fare_matrix(results):
+    """(header, rows): one row per sweep point, one price column per
+    vehicle type in order of first appearance"""
+    types = []
+    rows = []
+    for point, vehicles, _ in results:
+        prices = {}
+        for vehicle in vehicles or []:
+            vehicle_type = vehicle.get('Vehicle_Type', 'NA')
+            if vehicle_type not in prices:
+                prices[vehicle_type] = vehicle.get('Price', 'NA')
+            if vehicle_type not in types:
+                types.append(vehicle_type)
+        rows.append((point, prices))
+    header = list(SWEEP_FIELDS) + types
+    return header, [list(point) + [prices.get(kind, '') for kind in types]
+                    for point, prices in rows]
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = spider.get_parser()
+    parser.description = 'Fare matrix over dates, times, passengers and ' \
+        'luggage from one booking form'
+
+    parser.add_argument('--dates',
+                        help='Pick-up dates (mm/dd/yyyy); default --days '
+                        'dates from --date',
+                        metavar='date text',
+                        nargs='+')
+
+    parser.add_argument('--days',
+                        help='Consecutive dates from --date without --dates',
+                        metavar='int',
+                        type=int,
+                        default=1)
+
+    parser.add_argument('--times',
+                        help='Pick-up times; default --time',
+                        metavar='time text',
+                        nargs='+')
+
+    parser.add_argument('--passengers',
+                        help='Passenger counts; default --pass_num',
+                        metavar='int',
+                        nargs='+',
+                        type=int)
+
+    parser.add_argument('--luggage_counts',
+                        help='Luggage counts; default --luggage_num',
+                        metavar='int',
+                        nargs='+',
+                        type=int)
+
+    parser.add_argument('-m',
+                        '--matrix',
+                        help='Write the fare matrix CSV here instead of '
+                        'stdout',
+                        metavar='file')
+
+    return parser.parse_args()
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    points = sweep_points(args)
+
+    with stage_metrics.instrumented(args):
+        driver = spider.make_driver(args.headless)
+        spider.set_timeouts(driver, args.timeout, args.detail_timeout)
+        timer = StepTimer(args.timing_log)
+        resolver = LocationResolver(args.location_cache) \
+            if args.location_cache else None
+        results = []
+        try:
+            driver.maximize_window()
+            sweep = FareSweep(driver, args, resolver, timer)
+            for point, vehicles, seconds in sweep.run(points):
+                results.append((point, vehicles, seconds))
+                count = 'failed' if vehicles is None else \
+                    f'{len(vehicles)} vehicles'
+                print(f'{" ".join(map(str, point))}: {count} in '
+                      f'{seconds:.1f}s', file=sys.stderr)
+        finally:
+            driver.quit()
+            if resolver is not None:
+                resolver.close()
+
+    header, rows = fare_matrix(results)
+    out = open(args.matrix, 'w', newline='', encoding='utf-8') \
+        if args.matrix else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(header)
+        writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if results:
+        total = sum(seconds for _, _, seconds in results)
+        print(f'{sweep.stats["quotes"]} quotes, {sweep.stats["failed"]} '
+              f'failed, {sweep.stats["reloads"]} form loads, '
+              f'{total / len(results):.1f}s per quote', file=sys.stderr)
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
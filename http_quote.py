@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-19
+Purpose: Fetch quotes by replaying the booking form POST, without a browser
+"""
+import json
+import os
+
+from lxml import html
+
+from stage_metrics import METRICS, instrumented
+from vehicle_parser import (DEFAULT_ENGINE, ENGINES, parse_html,
+                            parse_page_count)
+
+# The booking app behind the iFrameResizer0 iframe on mayslimo.com
+BOOKING_URL = 'https://book.mylimobiz.com/v4/mayslimo'
+SEARCH_RATES_PATH = '/Booking/SearchRates'
+
+# Keys an HTML fragment may come back under when the endpoint answers JSON
+JSON_HTML_KEYS = ('Html', 'html', 'View', 'Content')
+
+
+def location_fields(prefix, text, resolved=None):
+    """Form fields for one autocomplete location.
+
+    The browser fills PickupLocation.Latitude, .Name, .Address, ... when a
+    suggestion is clicked; pass those as resolved to send them too.
+    """
+    fields = {f'{prefix}.AutocompleteTextbox': text}
+    for name, value in (resolved or {}).items():
+        fields[f'{prefix}.{name}'] = value
+    return fields
+
+
+class HttpQuoteFetcher:
+    """Replays the booking form over one pooled, cookie-keeping session.
+
+    The form page is loaded once per session for its cookies, service type
+    ids and anti-forgery token; every quote and result page after that is
+    a POST to SearchRates on the same connection pool.
+    """
+
+    def __init__(self, base_url=BOOKING_URL, pool_size=10, timeout=30,
+                 engine=DEFAULT_ENGINE, resolver=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.engine = engine
+        self.resolver = resolver
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.service_type_ids = []
+        self.hidden_fields = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Close the pooled connections"""
+        self.session.close()
+
+    def open_session(self):
+        """Load the booking form for cookies, service types and tokens"""
+        response = self.session.get(self.base_url, timeout=self.timeout)
+        response.raise_for_status()
+        form = html.fromstring(response.text)
+        self.service_type_ids = form.xpath(
+            "//select[@id='ServiceTypeId']/option/@value")
+        self.hidden_fields = {
+            field.get('name'): field.get('value', '')
+            for field in form.xpath("//input[@type='hidden'][@name]")
+            if field.get('name') == '__RequestVerificationToken'
+        }
+
+    def form_data(self, args, page_index=1):
+        """SearchRates form fields for one quote and result page"""
+        if not self.service_type_ids:
+            self.open_session()
+
+        resolve = self.resolver or (lambda prefix, text: None)
+        data = dict(self.hidden_fields)
+        data.update({
+            'ServiceTypeId': self.service_type_ids[args.service_type],
+            'PickUpDate': args.date,
+            'PickUpTime': args.time,
+            'PassengerNumber': args.pass_num,
+            'LuggageCount': args.luggage_num,
+            'vehiclePageIndex': page_index,
+        })
+        data.update(location_fields(
+            'PickupLocation', args.pickup_location_str,
+            resolve('PickupLocation', args.pickup_location_str)))
+        data.update(location_fields(
+            'DropoffLocation', args.dropoff_location_str,
+            resolve('DropoffLocation', args.dropoff_location_str)))
+        if args.add_stop:
+            data.update(location_fields(
+                'Stops[1]', args.stop_location,
+                resolve('Stops[1]', args.stop_location)))
+        if args.hr_num is not None:
+            data['HoursNumber'] = args.hr_num
+        return data
+
+    def fetch_page(self, args, page_index=1):
+        """HTML of one result page (page_index starts at 1)"""
+        with METRICS.time('fetch_seconds', mode='http'):
+            response = self.session.post(
+                self.base_url + SEARCH_RATES_PATH,
+                data=self.form_data(args, page_index), timeout=self.timeout)
+        response.raise_for_status()
+        if 'json' in response.headers.get('Content-Type', ''):
+            payload = response.json()
+            for key in JSON_HTML_KEYS:
+                if isinstance(payload, dict) and key in payload:
+                    return payload[key]
+            return json.dumps(payload)
+        return response.text
+
+    def fetch_quote(self, args, max_pages=None):
+        """Yield (page_no, html) for every result page, page_no from 0"""
+        content = self.fetch_page(args, 1)
+        num_pages = parse_page_count(content)
+        if max_pages:
+            num_pages = min(num_pages, max_pages)
+        yield 0, content
+        for page_no in range(1, num_pages):
+            yield page_no, self.fetch_page(args, page_no + 1)
+
+    def quote_vehicles(self, args, max_pages=None):
+        """Parsed vehicles of every result page, tagged with Page_No"""
+        vehicles = []
+        for page_no, content in self.fetch_quote(args, max_pages):
+            for vehicle in parse_html(content, self.engine):
+                vehicle['Page_No'] = page_no
+                vehicles.append(vehicle)
+        return vehicles
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments: the spider's quote options plus HTTP ones"""
+    from mayslimo_spider import get_parser
+
+    parser = get_parser()
+    parser.description = 'Booking quote over HTTP'
+
+    parser.add_argument('--base_url',
+                        help='Booking app URL',
+                        metavar='url',
+                        type=str,
+                        default=BOOKING_URL)
+
+    parser.add_argument('--max_pages',
+                        help='Stop after this many result pages',
+                        metavar='int',
+                        type=int)
+
+    parser.add_argument('--save',
+                        help='Also write page_N.html files to --out_dir',
+                        action='store_true')
+
+    parser.add_argument('--engine',
+                        help='Parse engine',
+                        choices=ENGINES,
+                        default=DEFAULT_ENGINE)
+
+    return parser.parse_args()
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    with instrumented(args):
+        fetch_and_parse(args)
+
+
+def fetch_and_parse(args):
+    """Fetch every page of the quote, printing vehicles per page"""
+    resolver = None
+    if args.location_cache:
+        from location_resolver import LocationResolver
+        resolver = LocationResolver(args.location_cache)
+
+    try:
+        with HttpQuoteFetcher(args.base_url, timeout=args.timeout,
+                              engine=args.engine,
+                              resolver=resolver) as fetcher:
+            total = 0
+            for page_no, content in fetcher.fetch_quote(args,
+                                                        args.max_pages):
+                if args.save:
+                    os.makedirs(args.out_dir, exist_ok=True)
+                    with open(os.path.join(args.out_dir,
+                                           f'page_{page_no}.html'),
+                              'w', encoding='utf-8') as file:
+                        file.write(content)
+                vehicles = parse_html(content, fetcher.engine)
+                total += len(vehicles)
+                print(f'Page {page_no}: {len(vehicles)} vehicles')
+            print(f'{total} vehicles')
+    finally:
+        if resolver is not None:
+            resolver.close()
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-12
+Purpose: Track which saved pages are already loaded, by content hash
+"""
+import hashlib
+import os
+
+UPSERT_QUERY = '''
+INSERT INTO ingest_manifest (content_hash, file_path, mtime, size, vehicle_count)
+VALUES %s
+ON CONFLICT (content_hash) DO UPDATE
+SET file_path = EXCLUDED.file_path, mtime = EXCLUDED.mtime,
+    size = EXCLUDED.size
+'''
+
+
+def file_hash(file_path):
+    """SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """The ingest_manifest table, loaded once per run.
+
+    A file whose path, mtime and size match a manifest row is skipped
+    without being read. Otherwise its content hash is checked, so a page
+    that was copied or touched but not changed is skipped without parsing.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.hashes = set()
+        self.stats = {}
+        self.pending = []
+        self.file_hashes = {}
+
+        with connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT content_hash, file_path, mtime, size '
+                    'FROM ingest_manifest')
+                for content_hash, file_path, mtime, size in cursor:
+                    self.hashes.add(content_hash)
+                    self.stats[file_path] = (mtime, size)
+
+    def is_new(self, file_path):
+        """True when the file's content has not been loaded yet"""
+        stat = os.stat(file_path)
+        if self.stats.get(file_path) == (stat.st_mtime, stat.st_size):
+            return False
+
+        content_hash = file_hash(file_path)
+        self.file_hashes[file_path] = (content_hash, stat.st_mtime,
+                                       stat.st_size)
+        if content_hash in self.hashes:
+            # Same content under a new path or mtime: remember the new stat
+            self.pending.append((content_hash, file_path, stat.st_mtime,
+                                 stat.st_size, 0))
+            return False
+        # Claimed now so identical copies later in the same run are skipped
+        self.hashes.add(content_hash)
+        return True
+
+    def mark_loaded(self, file_path, vehicle_count):
+        """Queue a manifest row for a file whose vehicles were stored"""
+        content_hash, mtime, size = self.file_hashes.pop(file_path)
+        self.pending.append((content_hash, file_path, mtime, size,
+                             vehicle_count))
+
+    def save(self):
+        """Write the queued manifest rows in one transaction"""
+        if not self.pending:
+            return
+        # One row per hash; the first carries the vehicle count
+        rows = {}
+        for row in self.pending:
+            first = rows.setdefault(row[0], row)
+            rows[row[0]] = row[:4] + (max(first[4], row[4]), )
+        self.pending = []
+        from psycopg2.extras import execute_values
+
+        with self.connection:
+            with self.connection.cursor() as cursor:
+                execute_values(cursor, UPSERT_QUERY, list(rows.values()))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-30
+Purpose: Persistent cache of autocomplete suggestions picked for locations
+"""
+import json
+import sqlite3
+import time
+
+from quote_params import normalize_text
+
+# Fields the booking form fills when an autocomplete suggestion is clicked,
+# as <prefix>_<field> ids and <prefix>.<field> names
+RESOLVED_FIELDS = ('Latitude', 'Longitude', 'Name', 'Address', 'AddressLine2',
+                   'PostalCode', 'City', 'County', 'Region', 'Country',
+                   'AirportCode', 'Ores4LocationTemplate')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS locations (
+    query       TEXT PRIMARY KEY,
+    text        TEXT NOT NULL,
+    fields      TEXT NOT NULL,
+    verified_at REAL NOT NULL
+)
+'''
+
+
+class LocationResolver:
+    """Free-text location -> the suggestion the site resolved it to.
+
+    An entry holds the visible text left in the autocomplete box and the
+    hidden fields behind it. Entries older than verify_after seconds are
+    still returned by get(), but stale() tells the spider to resolve them
+    through the suggestion list again; store() then refreshes the entry and
+    counts it as changed when the site now resolves to something else.
+
+    Called as resolver(prefix, text), it is the HttpQuoteFetcher resolver
+    hook and returns the cached fields or None.
+    """
+
+    def __init__(self, path, verify_after=7 * 24 * 3600, clock=time.time):
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute(SCHEMA)
+        self.verify_after = verify_after
+        self.clock = clock
+        self.stats = {'hits': 0, 'misses': 0, 'refreshed': 0, 'changed': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __call__(self, prefix, text):
+        entry = self.get(text)
+        return entry['fields'] if entry else None
+
+    def get(self, text):
+        """{'text', 'fields', 'verified_at'} for a location, or None"""
+        row = self.db.execute(
+            'SELECT text, fields, verified_at FROM locations WHERE query = ?',
+            (normalize_text(text), )).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return {'text': row[0], 'fields': json.loads(row[1]),
+                'verified_at': row[2]}
+
+    def stale(self, entry):
+        """True when an entry is due to be checked against the live site"""
+        return self.clock() - entry['verified_at'] >= self.verify_after
+
+    def store(self, text, resolved_text, fields, previous=None):
+        """Save what the suggestion list resolved a location to"""
+        if previous is not None:
+            self.stats['refreshed'] += 1
+            if (previous['text'] != resolved_text
+                    or previous['fields'] != fields):
+                self.stats['changed'] += 1
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?)',
+                (normalize_text(text), resolved_text,
+                 json.dumps(fields, sort_keys=True), self.clock()))
+
+    def forget(self, text):
+        """Drop a location, e.g. after the form rejected its fields"""
+        with self.db:
+            self.db.execute('DELETE FROM locations WHERE query = ?',
+                            (normalize_text(text), ))
+
+    def close(self):
+        self.db.close()
@@ -4,30 +4,142 @@ Author : stan <stan@localhost>
 Date   : 2024-06-25
 Purpose: Booking Spider
 """
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+# By and the exceptions are light; the WebDriver, wait and expected
+# condition modules pull in most of selenium and are imported where used
+# (the conditions through _ec()), so --help and parse-only callers skip them
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select
-from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, StaleElementReferenceException
-from selenium.webdriver.common.action_chains import ActionChains
+from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, StaleElementReferenceException, TimeoutException
 import os
-from bs4 import BeautifulSoup
-import time
 import argparse
+import weakref
 
-service = Service(executable_path='./chromedriver.exe')
-driver = webdriver.Chrome(service=service)
-# use to change the webdriver wait times
-wait = WebDriverWait(driver, 30)
+import stage_metrics
+from crawl_timing import StepTimer
+from location_resolver import RESOLVED_FIELDS, LocationResolver
+from quote_params import clear_quote_key, save_quote_key
+from vehicle_parser import DATA_DIR
 
+# use to change the webdriver wait times
 # adjust this based on connection speed
+WAIT_TIMEOUT = 30
+# wait for the rate detail panels to finish expanding
+DETAIL_TIMEOUT = 10
+CHROMEDRIVER_PATH = './chromedriver.exe'
+# (wait, detail) timeouts set_timeouts gave a driver
+_TIMEOUTS = weakref.WeakKeyDictionary()
+
+VEHICLE_ITEM_CSS = 'div.vehicle-grid-item'
+PAGE_LINK_CSS = 'li.page a'
+ACTIVE_PAGE_CSS = 'li.page.active a'
+RATE_DETAILS_BUTTON_CSS = 'button[data-target^="#rateDetails"]'
+
+# [visible text, {field: value}] of a location box and its hidden fields,
+# found by name: Region and Country are hidden inputs without an id, whose
+# ids belong to disabled selects
+READ_LOCATION_JS = '''
+var prefix = arguments[1], fields = {};
+arguments[2].forEach(function (name) {
+    var field = document.getElementsByName(prefix + name)[0];
+    if (field) { fields[name] = field.value; }
+});
+return [document.getElementById(arguments[0]).value, fields];
+'''
+# click every closed rate details button at once, as a user would, so the
+# site's handler opens the collapse and fetches its rate rows; returns the
+# #rateDetailsN selectors
+EXPAND_RATE_DETAILS_JS = '''
+var buttons = document.querySelectorAll(
+    'div.vehicle-grid-item-price button[data-target^="#rateDetails"]');
+var targets = [];
+for (var i = 0; i < buttons.length; i++) {
+    var target = buttons[i].getAttribute('data-target');
+    targets.push(target);
+    var panel = document.querySelector(target);
+    if (panel && !panel.classList.contains('in')) {
+        buttons[i].click();
+    }
+}
+return targets;
+'''
+# true once every given collapse is open and its fetched rate rows are in
+RATE_DETAILS_OPEN_JS = '''
+return arguments[0].every(function (target) {
+    var panel = document.querySelector(target);
+    return !panel || (panel.classList.contains('in') &&
+                      panel.querySelector('tr.child') !== null);
+});
+'''
+# click the pagination link labelled arguments[0]; false when there is none
+CLICK_PAGE_JS = '''
+var links = document.querySelectorAll('li.page a');
+for (var i = 0; i < links.length; i++) {
+    if (links[i].textContent.trim() === arguments[0]) {
+        links[i].click();
+        return true;
+    }
+}
+return false;
+'''
+CAPTURE_MODES = ('script', 'clicks')
+# write a cached suggestion into a location box and its hidden fields
+# write a location box and its hidden fields, then fire the box's change
+# handlers as picking a suggestion would
+FILL_LOCATION_JS = '''
+var box = document.getElementById(arguments[0]);
+var prefix = arguments[1], fields = arguments[3];
+box.value = arguments[2];
+Object.keys(fields).forEach(function (name) {
+    var field = document.getElementsByName(prefix + name)[0];
+    if (field) { field.value = fields[name]; }
+});
+box.dispatchEvent(new Event('change', {bubbles: true}));
+'''
+
+
+def make_driver(headless=False, executable_path=CHROMEDRIVER_PATH):
+    """Start a Chrome session"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless=new')
+    service = Service(executable_path=executable_path)
+    return webdriver.Chrome(service=service, options=options)
+
+
+def get_wait(driver, timeout=None, ignored_exceptions=None):
+    """WebDriverWait bound to a driver, by default with its wait timeout"""
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    if timeout is None:
+        timeout = get_timeouts(driver)[0]
+    return WebDriverWait(driver, timeout,
+                         ignored_exceptions=ignored_exceptions)
+
+
+def _ec():
+    """selenium's expected_conditions, imported on first use"""
+    from selenium.webdriver.support import expected_conditions
+
+    return expected_conditions
+
+
+def set_timeouts(driver, timeout=None, detail_timeout=None):
+    """Override the wait timeouts of one driver; None keeps a default"""
+    _TIMEOUTS[driver] = (
+        WAIT_TIMEOUT if timeout is None else timeout,
+        DETAIL_TIMEOUT if detail_timeout is None else detail_timeout)
+
+
+def get_timeouts(driver):
+    """(wait, detail) timeouts of a driver"""
+    return _TIMEOUTS.get(driver, (WAIT_TIMEOUT, DETAIL_TIMEOUT))
 
 
 # --------------------------------------------------
-def get_args():
-    """Get command-line arguments"""
+def get_parser():
+    """Command-line parser, also the source of quote parameter defaults"""
 
     parser = argparse.ArgumentParser(
         description='Booking Spider',
@@ -112,78 +224,156 @@ def get_args():
                         help='Boolean flag to add stop',
                         action='store_true')
 
-    return parser.parse_args()
+    parser.add_argument('-o',
+                        '--out_dir',
+                        help='Directory for the saved page sources',
+                        metavar='dir',
+                        type=str,
+                        default=DATA_DIR)
+
+    parser.add_argument('--headless',
+                        help='Run Chrome without a window',
+                        action='store_true')
+
+    parser.add_argument('--timeout',
+                        help='Seconds to wait for the form and vehicle grid',
+                        metavar='float',
+                        type=float,
+                        default=WAIT_TIMEOUT)
+
+    parser.add_argument('--detail_timeout',
+                        help='Seconds to wait for rate details to expand',
+                        metavar='float',
+                        type=float,
+                        default=DETAIL_TIMEOUT)
+
+    parser.add_argument('--location_cache',
+                        help='SQLite file of resolved autocomplete locations',
+                        metavar='file',
+                        type=str)
+
+    parser.add_argument('--timing_log',
+                        help='Append per-step latencies to this JSON-lines file',
+                        metavar='file',
+                        type=str)
+
+    parser.add_argument('--capture',
+                        help='Expand rate details and page with one script '
+                        'call each, or with a WebDriver click per button',
+                        choices=CAPTURE_MODES,
+                        default='script')
+
+    stage_metrics.add_arguments(parser)
+    return parser
+
+
+def get_args(argv=None):
+    """Get command-line arguments"""
+    return get_parser().parse_args(argv)
+
+
+def quote_defaults():
+    """Quote parameters with every field at its command-line default"""
+    return get_parser().parse_args([])
 
 
-def switch_to_frame():
+def switch_to_frame(driver):
     """Switches to iframe for booking service"""
-    wait.until(
-        EC.frame_to_be_available_and_switch_to_it((By.ID, 'iFrameResizer0')))
+    get_wait(driver).until(_ec().frame_to_be_available_and_switch_to_it(
+        (By.ID, 'iFrameResizer0')))
 
 
-def select_service(service_type):
+def select_service(driver, service_type):
     """Selects service type"""
-    wait.until(EC.presence_of_element_located((By.ID, 'ServiceTypeId')))
+    from selenium.webdriver.support.ui import Select
+
+    get_wait(driver).until(
+        _ec().presence_of_element_located((By.ID, 'ServiceTypeId')))
     dropdown_element = driver.find_element(By.ID, 'ServiceTypeId')
     select = Select(dropdown_element)
     select.select_by_index(service_type)
 
 
-def select_date(date_text):
+def select_date(driver, date_text):
     """Select the appropriate date"""
-    wait.until(EC.presence_of_element_located((By.ID, 'PickUpDate')))
+    get_wait(driver).until(
+        _ec().presence_of_element_located((By.ID, 'PickUpDate')))
     date_input = driver.find_element(By.ID, 'PickUpDate')
     date_input.click()
     date_input.clear()
     driver.execute_script(f"arguments[0].value = '{date_text}';", date_input)
 
 
-def select_time(select_time):
+def select_time(driver, select_time):
     """Selects time for ride"""
     time_input = driver.find_element(By.ID, 'PickUpTime')
     time_input.clear()
     driver.execute_script(f"arguments[0].value = '{select_time}';", time_input)
 
 
-def pickUp_location(pickup_location_str):
+def read_location(driver, input_id, field_prefix):
+    """Visible text and hidden fields of one autocomplete location"""
+    return driver.execute_script(READ_LOCATION_JS, input_id, field_prefix,
+                                 list(RESOLVED_FIELDS))
+
+
+def fill_location(driver, input_id, location_str, suggestion_xpath,
+                  field_prefix=None, resolver=None):
+    """Type a location and pick a suggestion, or reuse a cached one.
+
+    With a resolver, a location resolved before is written straight into
+    the box and its hidden fields (named <field_prefix><field>), then read
+    back once the site's change handlers have run to check the form kept
+    it. Unknown, stale or rejected locations go through the suggestion
+    list, and what it resolved to is stored for next time.
+    """
+    field_prefix = field_prefix or input_id + '.'
+    entry = resolver.get(location_str) if resolver else None
+    if entry is not None and not resolver.stale(entry):
+        driver.execute_script(FILL_LOCATION_JS, input_id, field_prefix,
+                              entry['text'], entry['fields'])
+        text, fields = read_location(driver, input_id, field_prefix)
+        if text == entry['text'] and fields == entry['fields']:
+            return
+        resolver.forget(location_str)
+
+    location_input = driver.find_element(By.ID, input_id)
+    location_input.clear()
+    location_input.send_keys(location_str)
+    get_wait(driver).until(
+        _ec().element_to_be_clickable((By.XPATH, suggestion_xpath))).click()
+    if resolver is not None:
+        text, fields = read_location(driver, input_id, field_prefix)
+        resolver.store(location_str, text, fields, entry)
+
+
+def pickUp_location(driver, pickup_location_str, resolver=None):
     """Pickup location address"""
-    pickup_location_input = driver.find_element(By.ID, 'PickupLocation')
-    pickup_location_input.clear()
-    pickup_location_input.send_keys(pickup_location_str)
-    wait.until(
-        EC.element_to_be_clickable(
-            (By.XPATH,
-             "//div[@id='PickupLocationSuggestionDiv']/ul//li[position()=2]"
-             ))).click()
+    fill_location(
+        driver, 'PickupLocation', pickup_location_str,
+        "//div[@id='PickupLocationSuggestionDiv']/ul//li[position()=2]",
+        resolver=resolver)
 
 
-def drop_off_location(dropoff_location_str):
+def drop_off_location(driver, dropoff_location_str, resolver=None):
     """Drop off location"""
-    dropoff_location_input = driver.find_element(By.ID, 'DropoffLocation')
-    dropoff_location_input.clear()
-    dropoff_location_input.send_keys(dropoff_location_str)
-    wait.until(
-        EC.element_to_be_clickable(
-            (By.XPATH,
-             "//div[@id='DropoffLocationSuggestionDiv']/ul//li[position()=2]"
-             ))).click()
+    fill_location(
+        driver, 'DropoffLocation', dropoff_location_str,
+        "//div[@id='DropoffLocationSuggestionDiv']/ul//li[position()=2]",
+        resolver=resolver)
 
 
-def add_stop(stop_location):
+def add_stop(driver, stop_location, resolver=None):
     """Checks to see whether we need stops"""
     add_stop_link = driver.find_element(By.ID, 'addNewStopLink')
     add_stop_link.click()
-    stop_input = driver.find_element(By.ID, 'Stops_1_')
-    stop_input.clear()
-    stop_input.send_keys(stop_location)
-    wait.until(
-        EC.element_to_be_clickable(
-            (By.XPATH,
-                "//div[@id='Stops_1_SuggestionDiv']/ul//li[position()=1]"
-                ))).click()
+    # the box has the id Stops_1_, its fields names like Stops[1].Latitude
+    fill_location(driver, 'Stops_1_', stop_location,
+                  "//div[@id='Stops_1_SuggestionDiv']/ul//li[position()=1]",
+                  field_prefix='Stops[1].', resolver=resolver)
 
 
-def no_passengers(pass_num):
+def no_passengers(driver, pass_num):
     """Passenger number"""
     passenger_input = driver.find_element(By.ID, 'PassengerNumber')
     passenger_input.clear()
@@ -191,14 +381,14 @@ def no_passengers(pass_num):
                           passenger_input)
 
 
-def no_hours(hr_num):
+def no_hours(driver, hr_num):
     """Estimated duration of trip"""
     no_hours = driver.find_element(By.ID, 'HoursNumber')
     no_hours.clear()
     driver.execute_script(f"arguments[0].value = '{hr_num}';", no_hours)
 
 
-def luggage_count(luggage_num):
+def luggage_count(driver, luggage_num):
     """Estimated number of luggage"""
     luggage_input = driver.find_element(By.ID, 'LuggageCount')
     luggage_input.clear()
@@ -206,124 +396,234 @@ def luggage_count(luggage_num):
                           luggage_input)
 
 
-def return_at_diff_location():
+def return_at_diff_location(driver):
     """Clicks the return to different location checkbox"""
+    from selenium.webdriver.common.action_chains import ActionChains
+
     checkbox = driver.find_element(By.ID, 'showDropoffLocation')
     ActionChains(driver).move_to_element(checkbox).perform()
     checkbox.click()
 
 
-def select_vehicle():
+def select_vehicle(driver):
     """Clicks the select vehicle button"""
-    wait.until(
-        EC.element_to_be_clickable(
+    get_wait(driver).until(
+        _ec().element_to_be_clickable(
             (By.XPATH, "//*[@id='showRatesBtn']"))).click()
 
 
-def click_rate_details_buttons():
+def wait_for_vehicle_grid(driver):
+    """Wait until the vehicle grid items are in the DOM"""
+    get_wait(driver).until(
+        _ec().presence_of_all_elements_located((By.CSS_SELECTOR,
+                                             VEHICLE_ITEM_CSS)))
+
+
+def wait_for_page(driver, page_num):
+    """Wait until pagination shows page_num (0-based) as the active page.
+    The pagination is re-rendered on a page switch, so an element found
+    just before that goes stale; the wait then finds it again."""
+    label = str(page_num + 1)
+    get_wait(driver, ignored_exceptions=(StaleElementReferenceException,)
+             ).until(lambda d: d.find_element(
+                 By.CSS_SELECTOR, ACTIVE_PAGE_CSS).text.strip() == label)
+    wait_for_vehicle_grid(driver)
+
+
+def click_rate_details_buttons(driver):
     """Click the rate details button for each vehicle item."""
     try:
-        wait.until(
-            EC.presence_of_all_elements_located(
+        get_wait(driver).until(
+            _ec().presence_of_all_elements_located(
                 (By.CLASS_NAME, "vehicle-grid-item-price")))
         
         vehicle_items = driver.find_elements(By.CLASS_NAME,
                                                      "vehicle-grid-item-price")
+        targets = []
         for vehicle_item in vehicle_items:
             try:
-                button = vehicle_item.find_elements(By.CLASS_NAME,
-                                                     "vehicle-decription-btn")[1]
+                button = vehicle_item.find_element(By.CSS_SELECTOR,
+                                                   RATE_DETAILS_BUTTON_CSS)
                 driver.execute_script("arguments[0].scrollIntoView(true);", button)
                 button.click()
+                targets.append(button.get_attribute('data-target'))
                
             except Exception as e:
                 print(f"Could not click the button for a vehicle item: {e}")
+
+        targets = [target for target in targets if target]
+        get_wait(driver, get_timeouts(driver)[1]).until(
+            lambda d: d.execute_script(RATE_DETAILS_OPEN_JS, targets))
     except Exception as e:
         print(
             f"An error occurred while trying to click rate details buttons: {e}"
         )
 
 
-def save_page_source(filename):
-    """Save the current page source to a file in the data folder."""
-    if not os.path.exists('data'):
-        os.makedirs('data')
-    with open(os.path.join('data', filename), 'w', encoding='utf-8') as file:
-        file.write(driver.page_source)
+def expand_rate_details(driver):
+    """Open every rate details panel with one script call, then wait once
+    for all of them to hold their rate rows. Panels still empty when the
+    wait runs out are logged and the page is captured anyway, as in the
+    clicks mode."""
+    get_wait(driver).until(
+        _ec().presence_of_all_elements_located(
+            (By.CLASS_NAME, "vehicle-grid-item-price")))
+    targets = driver.execute_script(EXPAND_RATE_DETAILS_JS)
+    try:
+        get_wait(driver, get_timeouts(driver)[1]).until(
+            lambda d: d.execute_script(RATE_DETAILS_OPEN_JS, targets))
+    except TimeoutException:
+        print(f"Rate details still loading for some of {len(targets)} "
+              f"vehicles, capturing the page as it is")
+    return len(targets)
+
 
+def go_to_page(driver, page_num):
+    """Click the pagination link of page_num (0-based) with one script
+    call and wait for the grid to show it"""
+    if not driver.execute_script(CLICK_PAGE_JS, str(page_num + 1)):
+        raise NoSuchElementException(f'No pagination link {page_num + 1}')
+    wait_for_page(driver, page_num)
 
-def click_next_until_disabled():
-    """Click the next page button"""
-    pages = driver.find_elements(By.CSS_SELECTOR, 'li.page a')
-    num_pages = len(pages)
+
+def save_page_source(driver, filename, directory=DATA_DIR, source=None):
+    """Save the current page source to a file in the data folder."""
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(os.path.join(directory, filename), 'w', encoding='utf-8') as file:
+        file.write(driver.page_source if source is None else source)
+
+
+def click_next_until_disabled(driver, directory=DATA_DIR, timer=None,
+                              on_page=None, capture='script'):
+    """Save every result page, moving on once pagination has updated.
+
+    Rate details are expanded before the source is captured. capture
+    'script' expands them and changes page with one execute_script call
+    each; 'clicks' keeps the WebDriver click per button and page link.
+    With on_page, each page source is handed to on_page(page_num, source)
+    instead of being written under directory. A failure on any page is
+    logged and raised again, so a partial quote never passes for a whole
+    one.
+    """
+    timer = timer or StepTimer()
+    wait_for_vehicle_grid(driver)
+    num_pages = max(1, len(driver.find_elements(By.CSS_SELECTOR,
+                                                PAGE_LINK_CSS)))
 
     for page_num in range(num_pages):
         try:
-            pages = driver.find_elements(By.CSS_SELECTOR, 'li.page a')
-            time.sleep(10)
-            save_page_source(f'page_{page_num}.html')
-            click_rate_details_buttons()
-            page_button = wait.until(
-                EC.element_to_be_clickable(pages[page_num]))
-            page_button.click()
-            print(f"Clicked page {page_num + 1}")
+            with timer.step('rate_details', page=page_num):
+                if capture == 'script':
+                    expand_rate_details(driver)
+                else:
+                    click_rate_details_buttons(driver)
+            with timer.step('page_capture', page=page_num):
+                # serializing the DOM is timed apart from handing it on
+                with timer.step('page_source', page=page_num):
+                    source = driver.page_source
+                if on_page is not None:
+                    on_page(page_num, source)
+                else:
+                    save_page_source(driver, f'page_{page_num}.html',
+                                     directory, source)
+            if page_num + 1 == num_pages:
+                break
+
+            with timer.step('page_switch', page=page_num + 1):
+                if capture == 'script':
+                    go_to_page(driver, page_num + 1)
+                else:
+                    pages = driver.find_elements(By.CSS_SELECTOR,
+                                                 PAGE_LINK_CSS)
+                    page_button = get_wait(driver).until(
+                        _ec().element_to_be_clickable(pages[page_num + 1]))
+                    page_button.click()
+                    wait_for_page(driver, page_num + 1)
+            print(f"Clicked page {page_num + 2}")
 
         except (NoSuchElementException, ElementClickInterceptedException,
                 StaleElementReferenceException) as e:
             print("No longer clickable or not found:", e)
-            break
+            raise
         except Exception as e:
             print("An unexpected error occurred:", e)
-            break
+            raise
+
+
+def fill_form(driver, args, resolver=None):
+    """Enter every quote field of args into the booking form"""
+    select_service(driver, args.service_type)
+    select_date(driver, args.date)
+    select_time(driver, args.time)
+    if args.add_stop:
+        add_stop(driver, args.stop_location, resolver)
+    pickUp_location(driver, args.pickup_location_str, resolver)
+    drop_off_location(driver, args.dropoff_location_str, resolver)
+    no_passengers(driver, args.pass_num)
+    luggage_count(driver, args.luggage_num)
+
+    if args.service_type == 3:
+        if args.bool_rtn_loc:
+            return_at_diff_location(driver)
+        no_hours(driver, args.hr_num)
+
+
+def run_quote(driver, args, directory=DATA_DIR, timer=None, on_page=None,
+              resolver=None):
+    """Fill in the booking form for one quote and save its result pages.
+
+    Without a resolver, one is opened on args.location_cache if given.
+    """
+    timer = timer or StepTimer()
+    if resolver is None and getattr(args, 'location_cache', None):
+        with LocationResolver(args.location_cache) as resolver:
+            return run_quote(driver, args, directory, timer, on_page,
+                             resolver)
+    set_timeouts(driver, args.timeout, args.detail_timeout)
+
+    with timer.step('page_load'):
+        driver.switch_to.default_content()
+        driver.get(args.url)
+        switch_to_frame(driver)
+
+    with timer.step('form_fill'):
+        fill_form(driver, args, resolver)
+
+    with timer.step('rate_fetch'):
+        select_vehicle(driver)
+        wait_for_vehicle_grid(driver)
+
+    if on_page is None:
+        clear_quote_key(directory)
+    click_next_until_disabled(driver, directory, timer, on_page,
+                              getattr(args, 'capture', 'script'))
+    if on_page is None:
+        # written last, so it marks a directory holding every page;
+        # batch_ingest --table vehicle_fares keys the saved pages by it
+        save_quote_key(directory, args)
+    return timer
 
 
 # --------------------------------------------------
 def main():
     args = get_args()
-    url_str = args.url
-    service_type = args.service_type
-    date_str = args.date
-    time_str = args.time
-    pickup_location_str = args.pickup_location_str
-    dropoff_location_str = args.dropoff_location_str
-    bool_stop = args.add_stop
-    pass_num = args.pass_num
-    hr_num = args.hr_num
-    luggage_num = args.luggage_num
-    bool_rtn_loc = args.bool_rtn_loc
-    stop_location = args.stop_location
+    with stage_metrics.instrumented(args):
+        driver = make_driver(args.headless)
+        timer = StepTimer(args.timing_log)
 
-    try:
-        driver.maximize_window()
-        driver.get(url_str)
-        time.sleep(10)
-        switch_to_frame()
-
-        select_service(service_type)
-        select_date(date_str)
-        select_time(time_str)
-        if bool_stop:
-            add_stop(stop_location)
-        pickUp_location(pickup_location_str)
-        drop_off_location(dropoff_location_str)
-        no_passengers(pass_num)
-        luggage_count(luggage_num)
-
-        if service_type == 3:
-            if bool_rtn_loc:
-                return_at_diff_location()
-            no_hours(hr_num)
-
-        select_vehicle()
-        click_next_until_disabled()
-
-    except Exception as ex:
-        print(ex)
-
-    finally:
-        time.sleep(5)
-        driver.close()
-        driver.quit()
+        try:
+            driver.maximize_window()
+            run_quote(driver, args, args.out_dir, timer)
+
+        except Exception as ex:
+            print(ex)
+
+        finally:
+            driver.close()
+            driver.quit()
+            for step, total in timer.summary().items():
+                print(f"{step}: {total['count']} x, {total['seconds']:.2f}s")
 
 
 # --------------------------------------------------
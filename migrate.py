@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-10
+Purpose: Apply the SQL migrations in migrations/ in order
+"""
+import argparse
+import os
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'migrations')
+
+CREATE_MIGRATIONS_TABLE = '''
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version    VARCHAR(255) PRIMARY KEY,
+    applied_at TIMESTAMP NOT NULL DEFAULT now()
+);
+'''
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Apply pending schema migrations',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-l',
+                        '--list',
+                        help='Only list pending migrations',
+                        action='store_true')
+
+    return parser.parse_args()
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """Sorted (version, path) pairs of the .sql files in a directory"""
+    return [(filename[:-len('.sql')], os.path.join(directory, filename))
+            for filename in sorted(os.listdir(directory))
+            if filename.endswith('.sql')]
+
+
+def pending_migrations(connection, directory=MIGRATIONS_DIR):
+    """Migrations not yet recorded in schema_migrations"""
+    with connection:
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_MIGRATIONS_TABLE)
+            cursor.execute('SELECT version FROM schema_migrations')
+            applied = {version for version, in cursor.fetchall()}
+    return [(version, path) for version, path in list_migrations(directory)
+            if version not in applied]
+
+
+def migrate(connection, directory=MIGRATIONS_DIR):
+    """Apply every pending migration, each in its own transaction"""
+    applied = []
+    for version, path in pending_migrations(connection, directory):
+        with open(path, 'r', encoding='utf-8') as file:
+            sql = file.read()
+        with connection:
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                cursor.execute(
+                    'INSERT INTO schema_migrations (version) VALUES (%s)',
+                    (version, ))
+        applied.append(version)
+    return applied
+
+
+# --------------------------------------------------
+def main():
+    from spider_db import DB_CONFIG
+
+    args = get_args()
+    connection = psycopg2.connect(**DB_CONFIG)
+    try:
+        if args.list:
+            for version, _ in pending_migrations(connection):
+                print(version)
+            return
+        for version in migrate(connection):
+            print(f'Applied {version}')
+    finally:
+        connection.close()
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
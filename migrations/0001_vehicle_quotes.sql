@@ -0,0 +1,21 @@
+-- Typed vehicle quotes, one row per vehicle on a saved booking page
+CREATE TABLE vehicle_quotes (
+    id               BIGSERIAL PRIMARY KEY,
+    vehicle_type     VARCHAR(255) NOT NULL,
+    vehicle_model    VARCHAR(255),
+    price_cents      INTEGER,
+    passenger_no     SMALLINT,
+    luggage_no       SMALLINT,
+    pickup_at        TIMESTAMP,
+    pickup_location  VARCHAR(255),
+    dropoff_location VARCHAR(255),
+    flat_rate_cents  INTEGER,
+    gratuity_cents   INTEGER,
+    tax_cents        INTEGER,
+    loaded_at        TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Fare lookups filter on route and date, then vehicle type
+CREATE INDEX vehicle_quotes_route_date_idx
+    ON vehicle_quotes (pickup_location, dropoff_location, pickup_at,
+                       vehicle_type);
@@ -0,0 +1,18 @@
+-- Saved pages already loaded, so re-runs skip unchanged files unparsed
+CREATE TABLE ingest_manifest (
+    content_hash  CHAR(64) PRIMARY KEY,
+    file_path     TEXT NOT NULL,
+    mtime         DOUBLE PRECISION NOT NULL,
+    size          BIGINT NOT NULL,
+    vehicle_count INTEGER NOT NULL,
+    loaded_at     TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX ingest_manifest_path_idx ON ingest_manifest (file_path);
+
+-- Natural key: quote parameters, vehicle type and result page
+ALTER TABLE vehicle_quotes ADD COLUMN page_no SMALLINT;
+
+CREATE UNIQUE INDEX vehicle_quotes_natural_key_idx
+    ON vehicle_quotes (pickup_location, dropoff_location, pickup_at,
+                       vehicle_type, page_no);
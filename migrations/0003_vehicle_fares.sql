@@ -0,0 +1,32 @@
+-- Fare history, one row per version of a vehicle's fare in a quote:
+-- a row is current while valid_to is NULL and is closed, not updated,
+-- when the vehicle disappears or its fare changes
+CREATE TABLE vehicle_fares (
+    id               BIGSERIAL PRIMARY KEY,
+    quote_key        TEXT NOT NULL,
+    vehicle_type     VARCHAR(255) NOT NULL,
+    vehicle_model    VARCHAR(255) NOT NULL DEFAULT '',
+    price_cents      INTEGER,
+    passenger_no     SMALLINT,
+    luggage_no       SMALLINT,
+    pickup_at        TIMESTAMP,
+    pickup_location  VARCHAR(255),
+    dropoff_location VARCHAR(255),
+    flat_rate_cents  INTEGER,
+    gratuity_cents   INTEGER,
+    tax_cents        INTEGER,
+    valid_from       TIMESTAMP NOT NULL,
+    valid_to         TIMESTAMP
+);
+
+-- Current snapshot lookup by quote, at most one open row per vehicle
+CREATE UNIQUE INDEX vehicle_fares_current_idx
+    ON vehicle_fares (quote_key, vehicle_type, vehicle_model)
+    WHERE valid_to IS NULL;
+
+-- History and as-of queries
+CREATE INDEX vehicle_fares_history_idx
+    ON vehicle_fares (quote_key, valid_from);
+
+CREATE VIEW vehicle_fares_current AS
+    SELECT * FROM vehicle_fares WHERE valid_to IS NULL;
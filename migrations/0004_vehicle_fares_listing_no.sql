@@ -0,0 +1,10 @@
+-- A vehicle type and model listed more than once in a quote keeps every
+-- listing, numbered from 0 in order of its fares
+ALTER TABLE vehicle_fares
+    ADD COLUMN listing_no SMALLINT NOT NULL DEFAULT 0;
+
+DROP INDEX vehicle_fares_current_idx;
+
+CREATE UNIQUE INDEX vehicle_fares_current_idx
+    ON vehicle_fares (quote_key, vehicle_type, vehicle_model, listing_no)
+    WHERE valid_to IS NULL;
@@ -0,0 +1,44 @@
+-- The natural key of 0002 left out the quote parameters a page does not
+-- show (service, stop, passengers, luggage, hours), and its columns were
+-- nullable, so rows with a NULL in them never clashed. Rows now carry
+-- their quote_params.quote_key and every key column is NOT NULL.
+-- listing_no numbers a vehicle type listed more than once on a page.
+ALTER TABLE vehicle_quotes ADD COLUMN quote_key TEXT NOT NULL DEFAULT '';
+ALTER TABLE vehicle_quotes ADD COLUMN listing_no SMALLINT NOT NULL DEFAULT 0;
+
+-- The old key would reject the rows that filling in the NULLs makes equal
+DROP INDEX vehicle_quotes_natural_key_idx;
+
+UPDATE vehicle_quotes SET
+    pickup_location  = COALESCE(pickup_location, ''),
+    dropoff_location = COALESCE(dropoff_location, ''),
+    pickup_at        = COALESCE(pickup_at, '-infinity'),
+    page_no          = COALESCE(page_no, 0)
+WHERE pickup_location IS NULL OR dropoff_location IS NULL
+   OR pickup_at IS NULL OR page_no IS NULL;
+
+-- Rows the NULLs kept apart are duplicates now; keep the first loaded
+DELETE FROM vehicle_quotes AS later
+USING vehicle_quotes AS first
+WHERE later.id > first.id
+  AND later.pickup_location = first.pickup_location
+  AND later.dropoff_location = first.dropoff_location
+  AND later.pickup_at = first.pickup_at
+  AND later.vehicle_type = first.vehicle_type
+  AND later.page_no = first.page_no;
+
+ALTER TABLE vehicle_quotes
+    ALTER COLUMN pickup_location SET DEFAULT '',
+    ALTER COLUMN pickup_location SET NOT NULL,
+    ALTER COLUMN dropoff_location SET DEFAULT '',
+    ALTER COLUMN dropoff_location SET NOT NULL,
+    ALTER COLUMN pickup_at SET DEFAULT '-infinity',
+    ALTER COLUMN pickup_at SET NOT NULL,
+    ALTER COLUMN page_no SET DEFAULT 0,
+    ALTER COLUMN page_no SET NOT NULL;
+
+-- Natural key: the quote, route, pickup time, vehicle type, page and
+-- listing
+CREATE UNIQUE INDEX vehicle_quotes_natural_key_idx
+    ON vehicle_quotes (quote_key, pickup_location, dropoff_location,
+                       pickup_at, vehicle_type, page_no, listing_no);
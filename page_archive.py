@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-26
+Purpose: Append-only compressed archive of raw booking pages
+"""
+import argparse
+import mmap
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+
+CODECS = ('zstd', 'zlib')
+DICT_SIZE = 112 * 1024
+# zlib only looks back 32 KB, so a bigger preset dictionary is wasted
+ZLIB_DICT_SIZE = 32 * 1024
+# pack trains the dictionary on at most this many of the first pages
+TRAIN_FILES = 1000
+TRAIN_BYTES = 32 * 1024 * 1024
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value BLOB
+);
+CREATE TABLE IF NOT EXISTS pages (
+    quote_key   TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    page_no     INTEGER NOT NULL,
+    offset      INTEGER NOT NULL,
+    length      INTEGER NOT NULL,
+    raw_length  INTEGER NOT NULL,
+    PRIMARY KEY (quote_key, captured_at, page_no)
+);
+'''
+
+
+class ZstdCodec:
+    """zstd frames sharing one dictionary"""
+
+    name = 'zstd'
+
+    def __init__(self, dict_data, level=9):
+        import zstandard
+
+        dict_type = zstandard.DICT_TYPE_AUTO
+        self.dict_data = zstandard.ZstdCompressionDict(dict_data,
+                                                       dict_type=dict_type)
+        self.compressor = zstandard.ZstdCompressor(level=level,
+                                                   dict_data=self.dict_data)
+        self.decompressor = zstandard.ZstdDecompressor(
+            dict_data=self.dict_data)
+
+    @staticmethod
+    def train(samples, dict_size=DICT_SIZE):
+        """Trained dictionary, or raw page content when there are too few
+        samples for the trainer"""
+        import zstandard
+
+        try:
+            return zstandard.train_dictionary(dict_size,
+                                              samples).as_bytes()
+        except zstandard.ZstdError:
+            return b''.join(samples)[-dict_size:]
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def decompress(self, data):
+        return self.decompressor.decompress(data)
+
+
+class ZlibCodec:
+    """Raw deflate streams with a shared preset dictionary (stdlib only)"""
+
+    name = 'zlib'
+
+    def __init__(self, dict_data, level=9):
+        self.dict_data = dict_data
+        self.level = level
+
+    @staticmethod
+    def train(samples, dict_size=ZLIB_DICT_SIZE):
+        """The opening bytes of a page, which every booking page shares"""
+        return samples[0][:min(dict_size, ZLIB_DICT_SIZE)]
+
+    def compress(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15,
+                                      zdict=self.dict_data)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data):
+        decompressor = zlib.decompressobj(-15, zdict=self.dict_data)
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+def default_codec():
+    """zstd when the zstandard package is installed, zlib otherwise"""
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return 'zlib'
+    return 'zstd'
+
+
+def _make_codec(name, dict_data):
+    return ZstdCodec(dict_data) if name == 'zstd' else ZlibCodec(dict_data)
+
+
+class PageArchive:
+    """Pages appended as independent compressed frames to <path>.dat.
+
+    <path>.idx is a SQLite index of (quote_key, captured_at, page_no) ->
+    (offset, length), plus the codec and its dictionary. The dictionary is
+    trained once, from the samples given to train() or else from the first
+    page appended, and shared by every frame. Reads mmap the data file and
+    decompress just the one frame asked for.
+
+    captured_at is an ISO time to the microsecond. A page whose key is
+    already archived is skipped, so packing the same files twice adds
+    nothing and no frame is ever left without an index entry.
+    """
+
+    def __init__(self, path, codec=None):
+        self.data_path = path + '.dat'
+        self.index = sqlite3.connect(path + '.idx')
+        self.index.executescript(SCHEMA)
+        self.data = open(self.data_path, 'ab')
+        self.map = None
+        self.codec = None
+        self.codec_name = codec or default_codec()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.skipped = 0
+        self.captures = {}
+
+        meta = dict(self.index.execute('SELECT key, value FROM meta'))
+        if 'codec' in meta:
+            self.codec_name = meta['codec']
+            self.codec = _make_codec(self.codec_name, meta['dict'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def train(self, samples):
+        """Build the shared dictionary; only possible on an empty archive"""
+        if self.codec is not None:
+            raise ValueError('Archive dictionary is already set')
+        codec_class = ZstdCodec if self.codec_name == 'zstd' else ZlibCodec
+        dict_data = codec_class.train(
+            [s.encode('utf-8') if isinstance(s, str) else s
+             for s in samples])
+        self.codec = _make_codec(self.codec_name, dict_data)
+        with self.index:
+            self.index.executemany(
+                'INSERT INTO meta (key, value) VALUES (?, ?)',
+                [('codec', self.codec_name), ('dict', dict_data)])
+
+    def append(self, quote_key, page_no, content, captured_at=None):
+        """Add one page unless its key is already archived; returns its
+        captured_at"""
+        captured_at = captured_at or datetime.now(timezone.utc).isoformat(
+            timespec='microseconds')
+        if self.index.execute(
+                'SELECT 1 FROM pages '
+                'WHERE quote_key = ? AND captured_at = ? AND page_no = ?',
+                (quote_key, captured_at, page_no)).fetchone():
+            self.skipped += 1
+            return captured_at
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        if self.codec is None:
+            self.train([data])
+
+        frame = self.codec.compress(data)
+        offset = self.data.seek(0, os.SEEK_END)
+        self.data.write(frame)
+        # frame bytes reach the file before the index points at them
+        self.data.flush()
+        self.index.execute(
+            'INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?)',
+            (quote_key, captured_at, page_no, offset, len(frame), len(data)))
+        self.bytes_in += len(data)
+        self.bytes_out += len(frame)
+        return captured_at
+
+    def write(self, quote_id, page_no, content):
+        """PageArchiver interface, so the pipeline can archive here.
+
+        Page 0 starts a new capture; later pages of the quote share its
+        captured_at.
+        """
+        captured_at = None if page_no == 0 else self.captures.get(quote_id)
+        self.captures[quote_id] = self.append(quote_id, page_no, content,
+                                              captured_at)
+        self.commit()
+
+    def commit(self):
+        """Make appended pages visible to other readers"""
+        self.index.commit()
+
+    def entries(self, quote_key=None):
+        """(quote_key, captured_at, page_no, length, raw_length) rows"""
+        query = ('SELECT quote_key, captured_at, page_no, length, raw_length '
+                 'FROM pages')
+        if quote_key is None:
+            return self.index.execute(
+                query + ' ORDER BY offset').fetchall()
+        return self.index.execute(
+            query + ' WHERE quote_key = ? ORDER BY captured_at, page_no',
+            (quote_key, )).fetchall()
+
+    def read(self, quote_key, captured_at, page_no):
+        """HTML of one archived page"""
+        row = self.index.execute(
+            'SELECT offset, length FROM pages '
+            'WHERE quote_key = ? AND captured_at = ? AND page_no = ?',
+            (quote_key, captured_at, page_no)).fetchone()
+        if row is None:
+            raise KeyError((quote_key, captured_at, page_no))
+        offset, length = row
+        return self.codec.decompress(self.frame(offset, length)).decode(
+            'utf-8')
+
+    def frame(self, offset, length):
+        """Raw frame bytes, from a mapping refreshed as the file grows"""
+        if self.map is None or offset + length > len(self.map):
+            self.data.flush()
+            if self.map is not None:
+                self.map.close()
+            with open(self.data_path, 'rb') as file:
+                self.map = mmap.mmap(file.fileno(), 0,
+                                     access=mmap.ACCESS_READ)
+        return self.map[offset:offset + length]
+
+    def iter_pages(self, quote_key=None):
+        """Yield (quote_key, captured_at, page_no, html)"""
+        for key, captured_at, page_no, _, _ in self.entries(quote_key):
+            yield key, captured_at, page_no, self.read(key, captured_at,
+                                                       page_no)
+
+    def close(self):
+        """Commit the index and close the files"""
+        self.index.commit()
+        self.index.close()
+        if self.map is not None:
+            self.map.close()
+        self.data.close()
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Compressed archive of raw booking pages',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    pack = commands.add_parser('pack', help='Append loose page_N.html files')
+    pack.add_argument('directory', metavar='dir', help='Directory to pack')
+    pack.add_argument('archive', metavar='archive', help='Archive path')
+    pack.add_argument('--codec', choices=CODECS, help='Codec for a new archive')
+
+    ls = commands.add_parser('ls', help='List archived pages')
+    ls.add_argument('archive', metavar='archive', help='Archive path')
+    ls.add_argument('--quote', metavar='key', help='Only this quote key')
+
+    cat = commands.add_parser('cat', help='Print one archived page')
+    cat.add_argument('archive', metavar='archive', help='Archive path')
+    cat.add_argument('quote', metavar='key', help='Quote key')
+    cat.add_argument('captured_at', metavar='time', help='Capture time')
+    cat.add_argument('page_no', metavar='int', type=int, help='Page number')
+
+    parse = commands.add_parser('parse', help='Re-parse every archived page')
+    parse.add_argument('archive', metavar='archive', help='Archive path')
+
+    return parser.parse_args()
+
+
+def read_samples(files, max_files=TRAIN_FILES, max_bytes=TRAIN_BYTES):
+    """Contents of the first files, up to max_files or max_bytes in all, as
+    dictionary training samples"""
+    samples = []
+    total = 0
+    for file_path in files[:max_files]:
+        with open(file_path, 'rb') as file:
+            samples.append(file.read())
+        total += len(samples[-1])
+        if total >= max_bytes:
+            break
+    return samples
+
+
+def pack_directory(directory, archive):
+    """Append every page_N.html under directory, one file in memory at a
+    time; the quote key is the one saved in the page's directory, or the
+    directory's name when it has none"""
+    import batch_ingest
+    from quote_params import load_quote_key
+
+    keys = {}
+    files = []
+    for root, _, filenames in os.walk(directory):
+        files.extend(os.path.join(root, name) for name in sorted(filenames)
+                     if name.endswith('.html'))
+
+    if archive.codec is None and files:
+        archive.train(read_samples(files))
+
+    for file_path in files:
+        with open(file_path, 'rb') as file:
+            content = file.read()
+        page_dir = os.path.dirname(file_path)
+        if page_dir not in keys:
+            keys[page_dir] = (load_quote_key(page_dir) or
+                              os.path.basename(os.path.abspath(page_dir)))
+        quote_key = keys[page_dir]
+        captured_at = datetime.fromtimestamp(
+            os.path.getmtime(file_path), timezone.utc).isoformat(
+                timespec='microseconds')
+        archive.append(quote_key, batch_ingest.page_number(file_path) or 0,
+                       content, captured_at)
+    archive.commit()
+    return len(files)
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+
+    with PageArchive(args.archive, getattr(args, 'codec', None)) as archive:
+        if args.command == 'pack':
+            count = pack_directory(args.directory, archive)
+            ratio = archive.bytes_out / archive.bytes_in if archive.bytes_in else 0
+            print(f'Packed {count - archive.skipped} pages with '
+                  f'{archive.codec_name}: {archive.bytes_in} -> '
+                  f'{archive.bytes_out} bytes ({ratio:.1%}), '
+                  f'{archive.skipped} already archived')
+        elif args.command == 'ls':
+            for entry in archive.entries(args.quote):
+                print('\t'.join(map(str, entry)))
+        elif args.command == 'cat':
+            sys.stdout.write(archive.read(args.quote, args.captured_at,
+                                          args.page_no))
+        else:
+            from vehicle_parser import parse_html
+
+            start = time.perf_counter()
+            pages = vehicles = 0
+            for _, _, _, content in archive.iter_pages():
+                pages += 1
+                vehicles += len(parse_html(content))
+            print(f'{pages} pages, {vehicles} vehicles in '
+                  f'{time.perf_counter() - start:.2f}s')
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-31
+Purpose: Columnar Arrow batches and a partitioned Parquet sink for vehicles
+"""
+import uuid
+
+from quote_params import normalize_text, short_digest
+from stage_metrics import METRICS
+from vehicle_normalize import RECORD_FIELDS, VehicleRecord
+
+# Partition columns derived from each record
+PARTITION_COLUMNS = ('pickup_date', 'route_id')
+
+
+def arrow_schema():
+    """Arrow schema of a record batch, partition columns last"""
+    import pyarrow as pa
+
+    return pa.schema([
+        ('vehicle_type', pa.string()),
+        ('vehicle_model', pa.string()),
+        ('price_cents', pa.int64()),
+        ('passenger_no', pa.int32()),
+        ('luggage_no', pa.int32()),
+        ('pickup_at', pa.timestamp('s')),
+        ('pickup_location', pa.string()),
+        ('dropoff_location', pa.string()),
+        ('flat_rate_cents', pa.int64()),
+        ('gratuity_cents', pa.int64()),
+        ('tax_cents', pa.int64()),
+        ('page_no', pa.int32()),
+        ('pickup_date', pa.date32()),
+        ('route_id', pa.string()),
+    ])
+
+
+def route_id(pickup_location, dropoff_location):
+    """Short stable id of a route: a digest of its normalized locations, so
+    partition directory names stay short whatever the addresses are"""
+    return short_digest(f'{normalize_text(pickup_location or "NA")} -> '
+                        f'{normalize_text(dropoff_location or "NA")}')
+
+
+class ColumnarBatch:
+    """Accumulates records column by column and hands out Arrow tables.
+
+    Only one Python list per column is kept, never the record objects, and
+    to_table() turns the lists into Arrow arrays in one pass per column.
+    """
+
+    def __init__(self):
+        self.columns = {name: [] for name in RECORD_FIELDS + PARTITION_COLUMNS}
+
+    def __len__(self):
+        return len(self.columns['vehicle_type'])
+
+    def append(self, record):
+        """Add one VehicleRecord"""
+        for field in RECORD_FIELDS:
+            self.columns[field].append(getattr(record, field))
+        pickup_at = record.pickup_at
+        self.columns['pickup_date'].append(
+            pickup_at.date() if pickup_at else None)
+        self.columns['route_id'].append(
+            route_id(record.pickup_location, record.dropoff_location))
+
+    def extend(self, vehicles):
+        """Add parsed vehicle dicts"""
+        for vehicle in vehicles:
+            self.append(VehicleRecord.from_vehicle(vehicle))
+
+    def to_table(self):
+        """Arrow table of the accumulated rows"""
+        import pyarrow as pa
+
+        schema = arrow_schema()
+        return pa.Table.from_arrays(
+            [pa.array(self.columns[field.name], type=field.type)
+             for field in schema], schema=schema)
+
+    def clear(self):
+        for values in self.columns.values():
+            values.clear()
+
+
+class ParquetSink:
+    """Parquet alternative to VehicleWriter, with the same write interface.
+
+    Records are batched in a ColumnarBatch and every batch_size rows
+    written under directory as a hive-partitioned dataset,
+    pickup_date=YYYY-MM-DD/route_id=<id>/part-<run>-<n>.parquet, so a date
+    or route can be scanned without touching the rest. The locations
+    themselves stay in the pickup_location and dropoff_location columns.
+    """
+
+    def __init__(self, directory, batch_size=50000,
+                 partition_by=PARTITION_COLUMNS):
+        import pyarrow.parquet  # noqa: F401
+
+        self.directory = directory
+        self.batch_size = max(1, batch_size)
+        self.partition_by = list(partition_by)
+        self.batch = ColumnarBatch()
+        self.run_id = uuid.uuid4().hex[:12]
+        self.rows_written = 0
+        self.batches_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        self.close()
+
+    def write(self, vehicles):
+        """Queue vehicles, flushing every time a batch fills up"""
+        for vehicle in vehicles:
+            self.batch.append(VehicleRecord.from_vehicle(vehicle))
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered rows as new files in their partitions"""
+        if not len(self.batch):
+            return
+        import pyarrow.parquet as pq
+
+        with METRICS.time('store_flush_seconds', table=self.directory,
+                          method='parquet'):
+            table = self.batch.to_table()
+            pq.write_to_dataset(
+                table, self.directory, partition_cols=self.partition_by,
+                basename_template=f'part-{self.run_id}-'
+                f'{self.batches_written}-{{i}}.parquet',
+                existing_data_behavior='overwrite_or_ignore')
+        METRICS.inc('rows_stored', table.num_rows, table=self.directory)
+        self.rows_written += table.num_rows
+        self.batches_written += 1
+        self.batch.clear()
+
+    def close(self):
+        """Drop unflushed rows"""
+        self.batch.clear()
+
+
+def read_dataset(directory, filters=None):
+    """Arrow table of a Parquet sink directory, e.g. with
+    filters=[('route_id', '=', route_id(pickup, dropoff))]"""
+    import pyarrow.parquet as pq
+
+    return pq.read_table(directory, filters=filters)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-24
+Purpose: Stream captured pages straight into the parser and the database
+"""
+import gzip
+import os
+import queue
+import threading
+
+from stage_metrics import instrumented
+from vehicle_parser import DEFAULT_ENGINE, parse_html
+
+COMPRESSIONS = ('gzip', 'zstd', 'none')
+_DONE = object()
+
+
+class PageArchiver:
+    """Optional side channel keeping the raw HTML, compressed.
+
+    Pages go to <directory>/<quote_id>/page_N.html[.gz|.zst]; quote_id is
+    quote_params.quote_dirname, so quotes that differ in any parameter, not
+    just date and time, get their own directory.
+    """
+
+    def __init__(self, directory, compression='gzip', level=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(
+                f"Unknown compression {compression!r}, expected one of "
+                f"{COMPRESSIONS}")
+        self.directory = directory
+        self.compression = compression
+        self.level = level
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if compression == 'zstd':
+            import zstandard
+            self.compressor = zstandard.ZstdCompressor(level=level or 3)
+
+    def compress(self, data):
+        """Compressed bytes and file suffix for one page"""
+        if self.compression == 'gzip':
+            return gzip.compress(data, compresslevel=self.level or 6), '.gz'
+        if self.compression == 'zstd':
+            return self.compressor.compress(data), '.zst'
+        return data, ''
+
+    def write(self, quote_id, page_no, content):
+        """Archive one page source"""
+        data = content.encode('utf-8')
+        compressed, suffix = self.compress(data)
+        directory = os.path.join(self.directory, str(quote_id))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'page_{page_no}.html{suffix}')
+        with open(path, 'wb') as file:
+            file.write(compressed)
+        self.bytes_in += len(data)
+        self.bytes_out += len(compressed)
+
+
+class PipelineStopped(Exception):
+    """Raised by emit once the consumer of a StreamingPipeline has failed"""
+
+
+class StreamingPipeline:
+    """Crawl -> parse -> store without writing page sources to disk first.
+
+    The producer runs in its own thread and emits (page_no, html) as pages
+    are captured. Pages pass through a queue of at most buffer_size
+    entries, so a slow parser or database blocks the crawler rather than
+    letting captured pages pile up in memory. Parsing and storing happen on
+    the calling thread.
+    """
+
+    def __init__(self, store=None, archive=None, buffer_size=8,
+                 engine=DEFAULT_ENGINE):
+        self.store = store
+        self.archive = archive
+        self.buffer_size = buffer_size
+        self.engine = engine
+        self.pages = 0
+        self.vehicles = 0
+        self.cache = None
+
+    def run(self, quote_id, produce):
+        """Run produce(emit) for one quote, consuming its pages as they come.
+
+        If consuming a page fails, emit raises PipelineStopped so the
+        producer gives up, the queue is drained to let a blocked put
+        return, and the producer thread is joined before the error is
+        raised again.
+        """
+        pages = queue.Queue(maxsize=self.buffer_size)
+        errors = []
+        stop = threading.Event()
+
+        def emit(page_no, content):
+            if stop.is_set():
+                raise PipelineStopped('Consumer failed')
+            pages.put((page_no, content))
+
+        def producer():
+            try:
+                produce(emit)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                pages.put(_DONE)
+
+        thread = threading.Thread(target=producer, daemon=True)
+        thread.start()
+        try:
+            for item in iter(pages.get, _DONE):
+                self.consume(quote_id, *item)
+        except BaseException:
+            stop.set()
+            for _ in iter(pages.get, _DONE):
+                pass
+            thread.join()
+            raise
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    def consume(self, quote_id, page_no, content):
+        """Archive, parse and store one captured page"""
+        if self.archive is not None:
+            self.archive.write(quote_id, page_no, content)
+        vehicles = parse_html(content, self.engine)
+        for vehicle in vehicles:
+            vehicle['Page_No'] = page_no
+        if self.store is not None:
+            self.store(vehicles)
+        self.pages += 1
+        self.vehicles += len(vehicles)
+
+
+def selenium_producer(driver, args, timer=None):
+    """produce(emit) capturing pages with the Selenium spider"""
+    from mayslimo_spider import run_quote
+
+    return lambda emit: run_quote(driver, args, timer=timer, on_page=emit)
+
+
+def http_producer(fetcher, args):
+    """produce(emit) fetching pages with the HTTP fetcher"""
+
+    def produce(emit):
+        for page_no, content in fetcher.fetch_quote(args):
+            emit(page_no, content)
+
+    return produce
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments: the spider's quote options plus pipeline"""
+    from mayslimo_spider import get_parser
+
+    parser = get_parser()
+    parser.description = 'Crawl, parse and store one quote in memory'
+
+    parser.add_argument('--mode',
+                        help='Capture pages with Selenium or over HTTP',
+                        choices=['selenium', 'http'],
+                        default='selenium')
+
+    parser.add_argument('--base_url',
+                        help='Booking app URL for --mode http',
+                        metavar='url',
+                        type=str)
+
+    parser.add_argument('--buffer',
+                        help='Captured pages held before the crawler blocks',
+                        metavar='int',
+                        type=int,
+                        default=8)
+
+    parser.add_argument('--archive_dir',
+                        help='Also keep compressed page sources here',
+                        metavar='dir',
+                        type=str)
+
+    parser.add_argument('--archive_file',
+                        help='Append page sources to this page_archive '
+                        'instead of loose files',
+                        metavar='path',
+                        type=str)
+
+    parser.add_argument('--compression',
+                        help='Archive compression',
+                        choices=COMPRESSIONS,
+                        default='gzip')
+
+    parser.add_argument('--cache_file',
+                        help='SQLite quote cache shared across runs',
+                        metavar='path',
+                        type=str)
+
+    parser.add_argument('--cache_ttl',
+                        help='Seconds a cached quote stays fresh (0: no cache)',
+                        metavar='int',
+                        type=int,
+                        default=3600)
+
+    parser.add_argument('--table',
+                        help='Store every vehicle, or only fare changes '
+                        'since the last crawl of this quote',
+                        choices=['vehicle_quotes', 'vehicle_fares'],
+                        default='vehicle_quotes')
+
+    parser.add_argument('-n',
+                        '--dry_run',
+                        help='Parse only, do not store',
+                        action='store_true')
+
+    return parser.parse_args()
+
+
+def _capturing(store, captured):
+    """store wrapper that also keeps every stored vehicle in captured"""
+
+    def capture(vehicles):
+        captured.extend(vehicles)
+        if store is not None:
+            store(vehicles)
+
+    return capture
+
+
+def run(args, store):
+    """Build the pipeline for the arguments and run one quote.
+
+    With --cache_file, a quote crawled less than --cache_ttl seconds ago is
+    served from the cache: its vehicles go straight to store and no browser
+    or HTTP session is opened. A quote is cached only when all of its pages
+    were captured; the cache and archive are closed either way.
+    """
+    cache = None
+    archive = None
+    try:
+        if args.cache_file and args.cache_ttl > 0:
+            from quote_cache import QuoteCache
+
+            cache = QuoteCache(args.cache_ttl, path=args.cache_file)
+            vehicles = cache.get(args)
+            if vehicles is not None:
+                pipeline = StreamingPipeline(store)
+                if store is not None:
+                    store(vehicles)
+                pipeline.vehicles = len(vehicles)
+                pipeline.cache = cache
+                return pipeline
+
+            captured = []
+            store = _capturing(store, captured)
+
+        quote_id = None
+        if args.archive_file:
+            from page_archive import PageArchive
+            from quote_params import quote_key
+
+            archive = PageArchive(args.archive_file)
+            quote_id = quote_key(args)
+        elif args.archive_dir:
+            from quote_params import quote_dirname
+
+            archive = PageArchiver(args.archive_dir, args.compression)
+            quote_id = quote_dirname(args)
+        pipeline = StreamingPipeline(store, archive, args.buffer)
+
+        if args.mode == 'http':
+            from http_quote import BOOKING_URL, HttpQuoteFetcher
+
+            resolver = None
+            if args.location_cache:
+                from location_resolver import LocationResolver
+                resolver = LocationResolver(args.location_cache)
+            try:
+                with HttpQuoteFetcher(args.base_url or BOOKING_URL,
+                                      resolver=resolver) as fetcher:
+                    pipeline.run(quote_id, http_producer(fetcher, args))
+            finally:
+                if resolver is not None:
+                    resolver.close()
+        else:
+            from crawl_timing import StepTimer
+            from mayslimo_spider import make_driver
+
+            driver = make_driver(args.headless)
+            try:
+                pipeline.run(quote_id, selenium_producer(
+                    driver, args, StepTimer(args.timing_log)))
+            finally:
+                driver.quit()
+
+        # only reached once every page was captured and stored, so a
+        # partial quote is never cached as fresh
+        if cache is not None:
+            cache.put(args, captured)
+        pipeline.cache = cache
+        return pipeline
+    finally:
+        if args.archive_file and archive is not None:
+            archive.close()
+        if cache is not None:
+            cache.close()
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    with instrumented(args):
+
+        if args.dry_run:
+            pipeline = run(args, None)
+        else:
+            from batch_ingest import open_writer
+            from quote_params import quote_key
+
+            key = quote_key(args)
+            with open_writer(args.table, 1000, key) as writer:
+                pipeline = run(args, writer.write)
+                if args.table == 'vehicle_fares':
+                    # run() raises unless every page was stored
+                    writer.mark_complete(key)
+            if args.table == 'vehicle_fares':
+                print(' '.join(f'{name}={value}'
+                               for name, value in writer.stats.items()))
+
+        print(f'{pipeline.pages} pages, {pipeline.vehicles} vehicles')
+        if pipeline.cache is not None:
+            print(' '.join(f'cache_{key}={value}'
+                           for key, value in pipeline.cache.stats.items()))
+        if pipeline.archive is not None and pipeline.archive.bytes_in:
+            archive = pipeline.archive
+            print(f'Archived {archive.bytes_in} bytes as {archive.bytes_out} '
+                  f'({archive.bytes_out / archive.bytes_in:.1%})')
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-29
+Purpose: TTL cache of parsed quote results keyed by quote parameters
+"""
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+from quote_params import quote_key
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS quotes (
+    quote_key TEXT PRIMARY KEY,
+    stored_at REAL NOT NULL,
+    vehicles  TEXT NOT NULL
+)
+'''
+
+
+class QuoteCache:
+    """Parsed vehicles per normalized quote, fresh for ttl seconds.
+
+    The first tier is an in-memory LRU of max_entries quotes. With a path,
+    a SQLite file backs it, so other processes and later runs share
+    results; disk hits are promoted into memory.
+    """
+
+    def __init__(self, ttl=3600, max_entries=1024, path=None,
+                 clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.memory = OrderedDict()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path)
+            self.db.execute(SCHEMA)
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0,
+                      'evictions': 0}
+
+    def fresh(self, stored_at):
+        return self.clock() - stored_at < self.ttl
+
+    def get(self, args):
+        """Cached vehicles for the quote, or None"""
+        key = quote_key(args)
+        entry = self.memory.get(key)
+        if entry is not None:
+            if self.fresh(entry[0]):
+                self.memory.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            del self.memory[key]
+            self.stats['expired'] += 1
+
+        if self.db is not None:
+            row = self.db.execute(
+                'SELECT stored_at, vehicles FROM quotes WHERE quote_key = ?',
+                (key, )).fetchone()
+            if row is not None and self.fresh(row[0]):
+                vehicles = json.loads(row[1])
+                self.remember(key, row[0], vehicles)
+                self.stats['hits'] += 1
+                self.stats['disk_hits'] += 1
+                return vehicles
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, args, vehicles):
+        """Store the vehicles of a freshly crawled quote"""
+        key = quote_key(args)
+        stored_at = self.clock()
+        self.remember(key, stored_at, vehicles)
+        if self.db is not None:
+            with self.db:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO quotes VALUES (?, ?, ?)',
+                    (key, stored_at, json.dumps(vehicles)))
+
+    def remember(self, key, stored_at, vehicles):
+        """Put an entry in the memory tier, evicting the least recent"""
+        self.memory[key] = (stored_at, vehicles)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def get_or_fetch(self, args, fetch):
+        """Cached vehicles, or fetch(args) stored and returned"""
+        vehicles = self.get(args)
+        if vehicles is None:
+            vehicles = fetch(args)
+            self.put(args, vehicles)
+        return vehicles
+
+    def purge(self):
+        """Drop expired entries from both tiers"""
+        cutoff = self.clock() - self.ttl
+        for key in [k for k, (at, _) in self.memory.items() if at <= cutoff]:
+            del self.memory[key]
+        if self.db is not None:
+            with self.db:
+                self.db.execute('DELETE FROM quotes WHERE stored_at <= ?',
+                                (cutoff, ))
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
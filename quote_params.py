@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-26
+Purpose: Normalized quote parameters shared by the archive and caches
+"""
+import hashlib
+import os
+import re
+from datetime import datetime
+
+# Saved next to a quote's page_N.html files by the spider
+QUOTE_KEY_FILE = 'quote_key.txt'
+
+# Spider options that decide which vehicles and prices a quote returns
+QUOTE_FIELDS = ('service_type', 'date', 'time', 'pickup_location_str',
+                'dropoff_location_str', 'stop_location', 'pass_num',
+                'luggage_num', 'hr_num')
+
+
+def normalize_text(text):
+    """Case- and whitespace-insensitive form of a location"""
+    return ' '.join(str(text).split()).lower()
+
+
+def normalize_date(text):
+    """mm/dd/yyyy -> yyyy-mm-dd, other text unchanged"""
+    try:
+        return datetime.strptime(text.strip(), '%m/%d/%Y').date().isoformat()
+    except ValueError:
+        return text.strip()
+
+
+def normalize_time(text):
+    """'9:30 am' -> '09:30', other text unchanged"""
+    try:
+        return datetime.strptime(' '.join(text.upper().split()),
+                                 '%I:%M %p').strftime('%H:%M')
+    except ValueError:
+        return text.strip()
+
+
+def short_digest(text, length=12):
+    """First length hex digits of the sha1 of text, for names and ids"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:length]
+
+
+def quote_params(args):
+    """Normalized quote parameters of a spider Namespace, field -> value"""
+    params = {
+        'service_type': args.service_type,
+        'date': normalize_date(args.date),
+        'time': normalize_time(args.time),
+        'pickup_location_str': normalize_text(args.pickup_location_str),
+        'dropoff_location_str': normalize_text(args.dropoff_location_str),
+        'stop_location': (normalize_text(args.stop_location)
+                          if args.add_stop else None),
+        'pass_num': args.pass_num,
+        'luggage_num': args.luggage_num,
+        # hours only apply to hourly service
+        'hr_num': args.hr_num if args.service_type == 3 else None,
+    }
+    return params
+
+
+def quote_key(args):
+    """Stable text key for the quote a spider Namespace asks for"""
+    params = quote_params(args)
+    return '|'.join(f'{field}={params[field]}' for field in QUOTE_FIELDS
+                    if params[field] is not None)
+
+
+def quote_dirname(args):
+    """File-system safe name of a quote: date, time and a digest of its key"""
+    params = quote_params(args)
+    when = re.sub(r'[^0-9A-Za-z]+', '-', f'{params["date"]}_{params["time"]}')
+    return f'{when}_{short_digest(quote_key(args))}'
+
+
+def save_quote_key(directory, args):
+    """Record the quote key of the pages saved in a directory"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, QUOTE_KEY_FILE), 'w',
+              encoding='utf-8') as file:
+        file.write(quote_key(args) + '\n')
+
+
+def clear_quote_key(directory):
+    """Forget the quote key of a directory whose pages are being replaced"""
+    try:
+        os.remove(os.path.join(directory, QUOTE_KEY_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def load_quote_key(directory):
+    """Quote key saved in a directory, None when there is none"""
+    try:
+        with open(os.path.join(directory, QUOTE_KEY_FILE), 'r',
+                  encoding='utf-8') as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
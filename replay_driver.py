@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-08-12
+Purpose: WebDriver stand-in replaying recorded result pages, with faults
+"""
+import os
+import re
+import time
+
+from lxml import html
+from selenium.common.exceptions import (ElementClickInterceptedException,
+                                        InvalidSelectorException,
+                                        JavascriptException,
+                                        NoSuchElementException,
+                                        StaleElementReferenceException)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+
+import mayslimo_spider as spider
+from stub_server import Faults
+
+_PAGE_FILE = re.compile(r'page_(\d+)\.html$')
+_SIMPLE = re.compile(r'([.#][\w-]+|\[[\w-]+(?:\^?="[^"]*")?\])')
+_ATTRIBUTE = re.compile(r'\[([\w-]+)(?:(\^?=)"([^"]*)")?\]')
+_RATE_DETAILS = "//div[starts-with(@id, 'rateDetails')]"
+_RATE_ROWS = (".//tr[contains(concat(' ', normalize-space(@class), ' '), "
+              "' child ')]")
+_GRID_PRICE = ("ancestor::div[contains(concat(' ', normalize-space(@class), "
+               "' '), ' vehicle-grid-item ')][1]"
+               "//div[contains(@class, 'vehicle-grid-item-price-numb')]")
+
+
+def css_to_xpath(selector, relative=False):
+    """XPath of a CSS selector made of tags, classes, ids, [attr],
+    [attr="v"] and [attr^="v"] joined by descendant combinators; that
+    covers the selectors the spider uses"""
+    steps = []
+    for part in selector.split():
+        match = re.match(r'[\w*]*', part)
+        tag = match.group() or '*'
+        tests = []
+        for simple in _SIMPLE.findall(part[match.end():]):
+            if simple[0] == '.':
+                tests.append("contains(concat(' ', normalize-space(@class), "
+                             f"' '), ' {simple[1:]} ')")
+            elif simple[0] == '#':
+                tests.append(f"@id='{simple[1:]}'")
+            else:
+                name, operator, value = _ATTRIBUTE.match(simple).groups()
+                tests.append(f"starts-with(@{name}, '{value}')"
+                             if operator == '^=' else
+                             f"@{name}='{value}'" if operator else f'@{name}')
+        steps.append(tag + ''.join(f'[{test}]' for test in tests))
+    return ('.//' if relative else '//') + '//'.join(steps)
+
+
+def locator_xpath(by, value, relative=False):
+    """XPath for a (By, value) locator"""
+    if by == By.XPATH:
+        return value
+    if by == By.ID:
+        value = '#' + value
+    elif by == By.CLASS_NAME:
+        value = '.' + value
+    elif by != By.CSS_SELECTOR and by != By.TAG_NAME:
+        raise InvalidSelectorException(f'Replay has no {by!r} locator')
+    return css_to_xpath(value, relative)
+
+
+class ReplayElement(WebElement):
+    """Element of the replayed DOM; goes stale once the page changes"""
+
+    def __init__(self, driver, node):
+        super().__init__(driver, str(id(node)))
+        self.node = node
+        self.version = driver.version
+
+    def check(self):
+        self.parent.settle()
+        if self.parent.version != self.version:
+            raise StaleElementReferenceException('Page changed')
+
+    @property
+    def tag_name(self):
+        self.check()
+        return self.node.tag
+
+    @property
+    def text(self):
+        self.check()
+        return ' '.join(self.node.text_content().split())
+
+    def get_attribute(self, name):
+        self.check()
+        return self.node.get(name)
+
+    get_dom_attribute = get_attribute
+
+    def is_displayed(self):
+        self.check()
+        return not any('display: none' in (node.get('style') or '')
+                       for node in self.node.iterancestors())
+
+    def is_enabled(self):
+        self.check()
+        return self.node.get('disabled') is None
+
+    def click(self):
+        self.check()
+        self.parent.click(self.node)
+
+    def find_elements(self, by=By.ID, value=None):
+        self.check()
+        return [ReplayElement(self.parent, node) for node in
+                self.node.xpath(locator_xpath(by, value, relative=True))]
+
+    def find_element(self, by=By.ID, value=None):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(f'No {value!r} in element')
+        return found[0]
+
+
+class _SwitchTo:
+
+    def default_content(self):
+        pass
+
+    def frame(self, frame_reference):
+        pass
+
+    def parent_frame(self):
+        pass
+
+
+class ReplayDriver:
+    """Serves recorded result pages to the spider's capture code offline.
+
+    The driver starts on the first result page, as right after Show
+    Rates. Pagination links and rate detail buttons work whether clicked
+    or driven by the spider's scripts: a page switch or a collapse opening
+    takes the faults' delay, the way the booking iframe updates
+    asynchronously, and every element found before a page switch goes
+    stale. An injected failure intercepts an element click or loses a
+    script click. The booking form itself is not replayed.
+    """
+
+    def __init__(self, pages, faults=None, clock=time.monotonic):
+        self.pages = list(pages)
+        self.faults = faults or Faults()
+        self.clock = clock
+        self.switch_to = _SwitchTo()
+        self.pending = []
+        self.stats = {'clicks': 0, 'scripts': 0, 'page_loads': 0,
+                      'failures': 0}
+        self.version = 0
+        self.load(0)
+
+    @classmethod
+    def from_directory(cls, directory, **kwargs):
+        """Replay of the page_N.html files of a directory, in page order"""
+        files = sorted((int(match.group(1)), filename)
+                       for filename in os.listdir(directory)
+                       for match in [_PAGE_FILE.search(filename)] if match)
+        pages = []
+        for _, filename in files:
+            with open(os.path.join(directory, filename), 'r',
+                      encoding='utf-8') as file:
+                pages.append(file.read())
+        return cls(pages, **kwargs)
+
+    def load(self, page_no):
+        """Show a result page with its rate details closed"""
+        self.tree = html.fromstring(self.pages[page_no])
+        self.page_no = page_no
+        self.version += 1
+        # panels still opening belonged to the page that was left
+        self.pending = [event for event in self.pending
+                        if event[1] != self.open_panel]
+        self.stats['page_loads'] += 1
+        for panel in self.tree.xpath(_RATE_DETAILS):
+            panel.set('class', ' '.join(
+                name for name in panel.get('class', '').split()
+                if name != 'in'))
+        # recordings may repeat a page, so the active link is set here
+        for link in self.tree.xpath(locator_xpath(By.CSS_SELECTOR,
+                                                  spider.PAGE_LINK_CSS)):
+            item = link.getparent()
+            names = [name for name in item.get('class', '').split()
+                     if name != 'active']
+            if link.text_content().strip() == str(page_no + 1):
+                names.append('active')
+            item.set('class', ' '.join(names))
+
+    def schedule(self, action, argument):
+        """Run action(argument) once its injected delay has passed"""
+        self.pending.append((self.clock() + self.faults.delay(), action,
+                             argument))
+
+    def settle(self):
+        """Apply the page switches and collapses that are due"""
+        now = self.clock()
+        due = [event for event in self.pending if event[0] <= now]
+        if not due:
+            return
+        self.pending = [event for event in self.pending if event[0] > now]
+        for _, action, argument in sorted(due, key=lambda event: event[0]):
+            action(argument)
+
+    def open_panel(self, target):
+        """Open a collapse and fill in its rate rows, as the site's fetch
+        does; recordings without rows get one Base Rate row holding the
+        vehicle's grid price"""
+        for panel in self.tree.xpath(locator_xpath(By.CSS_SELECTOR, target)):
+            names = panel.get('class', '').split()
+            if 'in' not in names:
+                panel.set('class', ' '.join(names + ['in']))
+            if panel.xpath(_RATE_ROWS):
+                continue
+            price = panel.xpath(_GRID_PRICE)
+            for body in panel.xpath('.//tbody')[:1]:
+                row = html.fragment_fromstring(
+                    '<tr class="child"><td>Base Rate</td><td></td></tr>')
+                row[1].text = price[0].text_content().strip() if price else ''
+                body.append(row)
+
+    def panel_open(self, target):
+        panels = self.tree.xpath(locator_xpath(By.CSS_SELECTOR, target))
+        return all('in' in panel.get('class', '').split() and
+                   panel.xpath(_RATE_ROWS) for panel in panels)
+
+    def failed(self):
+        failed = self.faults.failed()
+        self.stats['failures'] += failed
+        return failed
+
+    def go_to(self, label):
+        """Schedule the switch to the page a pagination label names"""
+        page_no = int(label) - 1
+        if 0 <= page_no < len(self.pages) and page_no != self.page_no:
+            self.schedule(self.load, page_no)
+
+    def click(self, node):
+        """Click on a replayed node"""
+        self.stats['clicks'] += 1
+        if self.failed():
+            raise ElementClickInterceptedException(
+                'Injected failure: click intercepted')
+        if node.get('data-toggle') == 'collapse' and node.get('data-target'):
+            self.schedule(self.open_panel, node.get('data-target'))
+        elif node.xpath('parent::li[contains(@class, "page")]'):
+            self.go_to(node.text_content().strip())
+
+    def links(self):
+        return self.tree.xpath(locator_xpath(By.CSS_SELECTOR,
+                                             spider.PAGE_LINK_CSS))
+
+    def execute_script(self, script, *args):
+        """Run one of the spider's scripts against the replayed page"""
+        self.settle()
+        self.stats['scripts'] += 1
+        if script == spider.EXPAND_RATE_DETAILS_JS:
+            buttons = self.tree.xpath(locator_xpath(
+                By.CSS_SELECTOR, 'div.vehicle-grid-item-price ' +
+                spider.RATE_DETAILS_BUTTON_CSS))
+            targets = [button.get('data-target') for button in buttons]
+            for target in targets:
+                if not self.panel_open(target):
+                    self.schedule(self.open_panel, target)
+            return targets
+        if script == spider.RATE_DETAILS_OPEN_JS:
+            return all(self.panel_open(target) for target in args[0])
+        if script == spider.CLICK_PAGE_JS:
+            if not any(link.text_content().strip() == args[0]
+                       for link in self.links()):
+                return False
+            if not self.failed():
+                self.go_to(args[0])
+            return True
+        if 'scrollIntoView' in script:
+            return None
+        raise JavascriptException('Replay cannot run this script')
+
+    def find_elements(self, by=By.ID, value=None):
+        self.settle()
+        return [ReplayElement(self, node)
+                for node in self.tree.xpath(locator_xpath(by, value))]
+
+    def find_element(self, by=By.ID, value=None):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(f'No {value!r} on replayed page')
+        return found[0]
+
+    @property
+    def page_source(self):
+        self.settle()
+        return html.tostring(self.tree, encoding='unicode',
+                             doctype='<!DOCTYPE html>')
+
+    def get(self, url):
+        """Back to the first result page"""
+        self.pending = []
+        self.load(0)
+
+    def maximize_window(self):
+        pass
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-08-05
+Purpose: Counters, latency histograms and profiling for crawl/parse/store
+"""
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = 'mayslimo_'
+# Upper bounds in seconds, from a parse call to a Selenium page load
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _label_value(value):
+    """Label value escaped as the Prometheus text format requires"""
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _label_text(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_label_value(value)}"'
+                          for name, value in pairs) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus exposes it"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'), ), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+        }
+
+
+class Metrics:
+    """Process-wide counters and histograms keyed by name and labels"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter"""
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Add one observation to a histogram"""
+        key = (name, _label_key(labels))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Observe the seconds a with block takes; failures are counted in
+        <name>_errors"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc(f'{name}_errors', **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def as_dict(self):
+        """JSON-ready summary of every metric"""
+        with self.lock:
+            return {
+                'counters': [
+                    {'name': name, 'labels': dict(key), 'value': value}
+                    for (name, key), value in sorted(self.counters.items())
+                ],
+                'histograms': [
+                    {'name': name, 'labels': dict(key), **hist.summary()}
+                    for (name, key), hist in sorted(self.histograms.items())
+                ],
+            }
+
+    def prometheus_text(self):
+        """Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, key), value in sorted(self.counters.items()):
+                metric = PREFIX + name + '_total'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} counter')
+                    typed.add(metric)
+                lines.append(f'{metric}{_label_text(key)} {value}')
+            for (name, key), hist in sorted(self.histograms.items()):
+                metric = PREFIX + name
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} histogram')
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(hist.buckets + (float('inf'), ),
+                                        hist.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket'
+                                 f'{_label_text(key, [("le", le)])} '
+                                 f'{cumulative}')
+                lines.append(f'{metric}_sum{_label_text(key)} {hist.sum}')
+                lines.append(f'{metric}_count{_label_text(key)} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.as_dict(), file, indent=2)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve /metrics from a daemon thread; returns the server"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# Shared by every instrumented module in the process
+METRICS = Metrics()
+
+
+def add_arguments(parser):
+    """--metrics_file, --metrics_port and --profile on a script's parser"""
+    parser.add_argument('--metrics_file',
+                        help='Write a JSON summary of stage metrics here',
+                        metavar='file',
+                        type=str)
+
+    parser.add_argument('--metrics_port',
+                        help='Serve Prometheus metrics on this port',
+                        metavar='int',
+                        type=int)
+
+    parser.add_argument('--profile',
+                        help='Save <prefix>.prof (cProfile, main thread '
+                        'only) and <prefix>.mem.txt (tracemalloc top '
+                        'allocations, all threads)',
+                        metavar='prefix',
+                        type=str)
+    return parser
+
+
+@contextmanager
+def instrumented(args):
+    """Run a script body with the metrics outputs and profilers its
+    arguments ask for. cProfile only sees the thread that enabled it, so
+    the profile leaves out worker threads (asyncio.to_thread fetches,
+    thread-pool crawls); tracemalloc covers every thread."""
+    server = profiler = None
+    if getattr(args, 'metrics_port', None):
+        server = METRICS.serve(args.metrics_port)
+    if getattr(args, 'profile', None):
+        import cProfile
+        import tracemalloc
+
+        tracemalloc.start(25)
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield METRICS
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile + '.prof')
+            write_memory_snapshot(args.profile + '.mem.txt')
+        if getattr(args, 'metrics_file', None):
+            METRICS.write_json(args.metrics_file)
+        if server is not None:
+            server.shutdown()
+
+
+def write_memory_snapshot(path, limit=30):
+    """Top allocation sites of the running tracemalloc trace"""
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(f'current {current / 1024:.0f} KiB, '
+                   f'peak {peak / 1024:.0f} KiB\n')
+        for stat in snapshot.statistics('lineno')[:limit]:
+            file.write(f'{stat}\n')
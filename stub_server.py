@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-19
+Purpose: Local stand-in for the booking app, serving recorded Data/ pages
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+BOOKING_PATH = '/v4/mayslimo'
+SESSION_COOKIE = 'ASP.NET_SessionId'
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Serve recorded booking pages locally',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-d',
+                        '--directory',
+                        metavar='dir',
+                        default='Data',
+                        help='Directory of recorded page_N.html files')
+
+    parser.add_argument('-p',
+                        '--port',
+                        metavar='int',
+                        type=int,
+                        default=8000,
+                        help='Port to listen on')
+
+    parser.add_argument('--latency',
+                        metavar='float',
+                        type=float,
+                        default=0.0,
+                        help='Seconds added to every response')
+
+    parser.add_argument('--jitter',
+                        metavar='float',
+                        type=float,
+                        default=0.0,
+                        help='Up to this many more seconds, at random')
+
+    parser.add_argument('--failure_rate',
+                        metavar='float',
+                        type=float,
+                        default=0.0,
+                        help='Share of requests answered 503')
+
+    parser.add_argument('--seed',
+                        metavar='int',
+                        type=int,
+                        help='Random seed for latency and failures')
+
+    return parser.parse_args()
+
+
+class Faults:
+    """Injected latency and failures, drawn from one seeded generator
+    shared by every thread"""
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.failures = 0
+
+    def delay(self):
+        """Seconds the next response or page update takes"""
+        with self.lock:
+            return self.latency + self.rng.uniform(0, self.jitter)
+
+    def failed(self):
+        """Whether the next request or click fails"""
+        with self.lock:
+            failed = self.rng.random() < self.failure_rate
+            self.failures += failed
+            return failed
+
+
+class BookingStubHandler(BaseHTTPRequestHandler):
+    """GET of the booking path returns the form page and a session cookie;
+    POST to SearchRates returns page_<vehiclePageIndex - 1>.html, but only
+    for a client that sends that cookie back. The server's faults delay
+    every response and turn some into 503s."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_page(self, page_no, cookie=None):
+        path = os.path.join(self.server.directory, f'page_{page_no}.html')
+        if not os.path.exists(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as file:
+            body = file.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if cookie:
+            self.send_header('Set-Cookie', f'{SESSION_COOKIE}={cookie}; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def count(self, name):
+        """Count a request; handlers run on concurrent threads"""
+        with self.server.faults.lock:
+            self.server.requests[name] += 1
+
+    def injected_failure(self):
+        """Wait out the injected latency; True once a 503 was sent"""
+        time.sleep(self.server.faults.delay())
+        if self.server.faults.failed():
+            self.count('failed')
+            self.send_error(503, 'Injected failure')
+            return True
+        return False
+
+    def do_GET(self):
+        if self.path.rstrip('/') != BOOKING_PATH:
+            self.send_error(404)
+            return
+        if self.injected_failure():
+            return
+        self.count('GET')
+        self.send_page(0, cookie=f'stub{threading.get_ident()}')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if self.path != BOOKING_PATH + '/Booking/SearchRates':
+            self.send_error(404)
+            return
+        if SESSION_COOKIE not in self.headers.get('Cookie', ''):
+            self.send_error(403, 'No booking session')
+            return
+        if self.injected_failure():
+            return
+        self.count('POST')
+        page_index = int(form.get('vehiclePageIndex', ['1'])[0])
+        self.send_page(page_index - 1)
+
+
+def start_stub_server(directory='Data', port=0, faults=None):
+    """Serve in a background thread; returns (server, booking base URL)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), BookingStubHandler)
+    server.directory = directory
+    server.faults = faults or Faults()
+    server.requests = {'GET': 0, 'POST': 0, 'failed': 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f'http://{host}:{port}{BOOKING_PATH}'
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    faults = Faults(args.latency, args.jitter, args.failure_rate, args.seed)
+    server, base_url = start_stub_server(args.directory, args.port, faults)
+    print(f'Serving {args.directory} at {base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-08-02
+Purpose: Synthesize booking result pages of any size from a saved page
+"""
+import argparse
+import copy
+import os
+import random
+
+from lxml import html
+
+import vehicle_parser
+
+TEMPLATE_PAGE = os.path.join('Data', 'page_0.html')
+
+# (vehicle type, model, passengers, luggage, base fare)
+VEHICLE_KINDS = (
+    ('Luxury Sedan', 'Cadillac XTS or Better', 3, 3, 95.0),
+    ('Executive Sedan', 'Lincoln Continental or Better', 3, 3, 100.0),
+    ('Luxury SUV', 'Cadillac Escalade or Better', 6, 6, 140.0),
+    ('Sprinter Van', 'Mercedes Sprinter or Better', 12, 12, 210.0),
+    ('Stretch Limousine', 'Lincoln MKT Stretch or Better', 10, 4, 260.0),
+    ('Mini Coach', 'Ford E-450 or Better', 24, 20, 380.0),
+    ('Motor Coach', 'MCI J4500 or Better', 56, 56, 640.0),
+    ('Party Bus', 'Freightliner M2 or Better', 30, 10, 520.0),
+)
+GRATUITY = 0.20
+TAX = 0.07
+
+
+class PageSynthesizer:
+    """Builds pages with the template's markup around a generated grid.
+
+    The date picker, forms and scripts of the template stay as they are,
+    so parse cost scales the way a real page's would; only the
+    vehicle-grid-item blocks and the pagination are replaced.
+    """
+
+    def __init__(self, template=TEMPLATE_PAGE, rates=True, seed=0):
+        with open(template, 'r', encoding='utf-8') as file:
+            self.template = html.fromstring(file.read())
+        self.item = vehicle_parser._VEHICLE_ITEMS(self.template)[0]
+        self.rates = rates
+        self.seed = seed
+
+    def vehicle_item(self, index, rng):
+        """One vehicle-grid-item element"""
+        kind, model, passengers, luggage, fare = VEHICLE_KINDS[
+            index % len(VEHICLE_KINDS)]
+        flat = round(fare * rng.uniform(0.9, 1.3), 2)
+        gratuity = round(flat * GRATUITY, 2)
+        tax = round(flat * TAX, 2)
+
+        item = copy.deepcopy(self.item)
+        vehicle_parser._HEADING(item)[0].text = kind
+        vehicle_parser._MODEL_P(item)[0].text = model
+        price = flat + gratuity + tax
+        vehicle_parser._PRICE(item)[0].text = f'\n\t\t\t\t${price:,.2f}\n\t\t\t'
+        addons = vehicle_parser._ADDONS(item)
+        addons[1].text = str(passengers)
+        addons[3].text = str(luggage)
+        for element in item.xpath(".//*[@id]"):
+            element.set('id', element.get('id').rstrip('0123456789') +
+                        str(index))
+
+        tbody = item.xpath('.//tbody')
+        if self.rates and tbody:
+            for label, amount in (('Flat Rate', flat),
+                                  (f'Std Grat({GRATUITY:.2%})', gratuity),
+                                  (f'GA State Taxes({TAX:.2%})', tax)):
+                row = html.fromstring(
+                    f'<tr class="child"><th>{label}</th>'
+                    f'<td>${amount:,.2f}</td></tr>')
+                tbody[0].append(row)
+        return item
+
+    def page(self, vehicles=8, page_no=0, pages=1):
+        """HTML of result page page_no of pages, holding vehicles items"""
+        rng = random.Random(self.seed * 1000003 + page_no)
+        root = copy.deepcopy(self.template)
+
+        old_items = vehicle_parser._VEHICLE_ITEMS(root)
+        grid = old_items[0].getparent()
+        position = grid.index(old_items[0])
+        for old_item in old_items:
+            old_item.getparent().remove(old_item)
+        for offset in range(vehicles):
+            item = self.vehicle_item(page_no * vehicles + offset, rng)
+            item.tail = '\n\t'
+            grid.insert(position + offset, item)
+
+        links = vehicle_parser._PAGE_LINKS(root)
+        if links:
+            pagination = links[0].getparent()
+            first = pagination.index(links[0])
+            for link in links:
+                pagination.remove(link)
+            for number in range(pages):
+                active = ' active' if number == page_no else ''
+                pagination.insert(first + number, html.fromstring(
+                    f'<li class="page{active}"><a href="#">{number + 1}</a>'
+                    '</li>'))
+
+        return html.tostring(root, encoding='unicode',
+                             doctype='<!DOCTYPE html>')
+
+    def quote(self, vehicles=8, pages=1):
+        """Every result page of one synthetic quote"""
+        return [self.page(vehicles, page_no, pages)
+                for page_no in range(pages)]
+
+
+# --------------------------------------------------
+def get_args():
+    """Get command-line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description='Write synthetic booking result pages',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('directory',
+                        metavar='dir',
+                        help='Where to write page_N.html files')
+
+    parser.add_argument('-v',
+                        '--vehicles',
+                        help='Vehicles per page',
+                        metavar='int',
+                        type=int,
+                        default=8)
+
+    parser.add_argument('-p',
+                        '--pages',
+                        help='Result pages',
+                        metavar='int',
+                        type=int,
+                        default=3)
+
+    parser.add_argument('--template',
+                        help='Saved page to build on',
+                        metavar='file',
+                        default=TEMPLATE_PAGE)
+
+    parser.add_argument('--no_rates',
+                        help='Leave the rate detail tables empty',
+                        action='store_true')
+
+    parser.add_argument('--seed',
+                        help='Random seed for the fares',
+                        metavar='int',
+                        type=int,
+                        default=0)
+
+    return parser.parse_args()
+
+
+# --------------------------------------------------
+def main():
+    args = get_args()
+    synthesizer = PageSynthesizer(args.template, not args.no_rates, args.seed)
+
+    os.makedirs(args.directory, exist_ok=True)
+    for page_no, content in enumerate(
+            synthesizer.quote(args.vehicles, args.pages)):
+        with open(os.path.join(args.directory, f'page_{page_no}.html'), 'w',
+                  encoding='utf-8') as file:
+            file.write(content)
+    print(f'Wrote {args.pages} pages of {args.vehicles} vehicles to '
+          f'{args.directory}')
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+import asyncio
+import os
+import threading
+
+from async_crawl import AsyncCrawler
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), 'Data')
+
+
+class FakeFetcher:
+    """Serves the recorded pages and notes which threads call it"""
+
+    def __init__(self):
+        self.threads = set()
+        self.closed = False
+
+    def fetch_page(self, args, page_index):
+        self.threads.add(threading.get_ident())
+        path = os.path.join(DATA, f'page_{page_index - 1}.html')
+        with open(path, encoding='utf-8') as file:
+            return file.read()
+
+    def close(self):
+        self.closed = True
+
+
+def test_each_thread_fetches_through_its_own_fetcher():
+    fetchers = []
+
+    def factory():
+        fetchers.append(FakeFetcher())
+        return fetchers[-1]
+
+    crawler = AsyncCrawler(concurrency=8, rate=1000, fetcher_factory=factory)
+    stats = asyncio.run(crawler.run((job_id, None) for job_id in range(12)))
+
+    assert stats['jobs_done'] == 12
+    assert stats['pages'] == 36
+    assert fetchers and all(len(fetcher.threads) == 1
+                            for fetcher in fetchers)
+    assert all(fetcher.closed for fetcher in fetchers)
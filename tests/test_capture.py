@@ -0,0 +1,77 @@
+import os
+
+import pytest
+from selenium.common.exceptions import ElementClickInterceptedException
+from selenium.webdriver.common.by import By
+
+import mayslimo_spider as spider
+from replay_driver import ReplayDriver
+from stub_server import Faults
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), 'Data')
+
+
+def replay(failure_rate=0.0):
+    driver = ReplayDriver.from_directory(
+        DATA, faults=Faults(0, 0, failure_rate, seed=0))
+    spider.set_timeouts(driver, 0.5, 0.5)
+    return driver
+
+
+@pytest.mark.parametrize('capture', spider.CAPTURE_MODES)
+def test_every_page_is_captured(capture):
+    pages = []
+    spider.click_next_until_disabled(
+        replay(), capture=capture,
+        on_page=lambda page_no, source: pages.append(page_no))
+    assert pages == [0, 1, 2]
+
+
+def test_failed_page_switch_is_raised_not_swallowed():
+    pages = []
+    with pytest.raises(ElementClickInterceptedException):
+        spider.click_next_until_disabled(
+            replay(failure_rate=1.0), capture='clicks',
+            on_page=lambda page_no, source: pages.append(page_no))
+    assert pages == [0]
+
+
+class SlowDetailsDriver(ReplayDriver):
+    """Replay whose rate detail panels never finish loading"""
+
+    def execute_script(self, script, *args):
+        if script == spider.RATE_DETAILS_OPEN_JS:
+            return False
+        return super().execute_script(script, *args)
+
+
+def test_slow_rate_details_still_capture_the_page():
+    driver = SlowDetailsDriver.from_directory(DATA, faults=Faults(0, 0, 0.0))
+    spider.set_timeouts(driver, 0.5, 0.05)
+    pages = []
+    spider.click_next_until_disabled(
+        driver, capture='script',
+        on_page=lambda page_no, source: pages.append(page_no))
+    assert pages == [0, 1, 2]
+
+
+class StalePaginationDriver(ReplayDriver):
+    """Replay that re-renders the pagination right after it is first
+    found"""
+
+    rerendered = False
+
+    def find_element(self, by=By.ID, value=None):
+        element = super().find_element(by, value)
+        if value == spider.ACTIVE_PAGE_CSS and not self.rerendered:
+            self.rerendered = True
+            self.version += 1
+        return element
+
+
+def test_stale_pagination_is_found_again():
+    driver = StalePaginationDriver.from_directory(DATA,
+                                                  faults=Faults(0, 0, 0.0))
+    spider.set_timeouts(driver, 0.5, 0.5)
+    spider.wait_for_page(driver, 0)
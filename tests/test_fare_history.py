@@ -0,0 +1,128 @@
+from datetime import datetime
+
+import fare_history
+from fare_history import FareHistory, diff_snapshot, listings
+from vehicle_normalize import VehicleRecord
+
+NOW = datetime(2024, 8, 9, 12, 0)
+
+
+def vehicle(vehicle_type, price, model='M'):
+    return {'Vehicle_Type': vehicle_type, 'Vehicle_Model': model,
+            'Price': price}
+
+
+def snapshot(*vehicles):
+    return listings(VehicleRecord.from_vehicle(v) for v in vehicles)
+
+
+def test_diff_snapshot_finds_new_removed_and_changed():
+    previous = {key: fare_history.fare_version(record) for key, record in
+                snapshot(vehicle('Sedan', '$100.00'),
+                         vehicle('SUV', '$150.00'),
+                         vehicle('Van', '$200.00')).items()}
+    records = snapshot(vehicle('Sedan', '$100.00'),
+                       vehicle('SUV', '$160.00'),
+                       vehicle('Bus', '$300.00'))
+
+    inserted, removed, changed = diff_snapshot(previous, records)
+
+    assert inserted == [('Bus', 'M', 0)]
+    assert removed == [('Van', 'M', 0)]
+    assert changed == [('SUV', 'M', 0)]
+
+
+def test_listings_number_repeats_by_fare_not_page_order():
+    first = snapshot(vehicle('Sedan', '$120.00'), vehicle('Sedan', '$90.00'))
+    second = snapshot(vehicle('Sedan', '$90.00'), vehicle('Sedan', '$120.00'))
+    assert sorted(first) == [('Sedan', 'M', 0), ('Sedan', 'M', 1)]
+    assert {key: record.price_cents for key, record in first.items()} == \
+        {key: record.price_cents for key, record in second.items()}
+
+
+class FakeCursor:
+    """Serves the current rows and records what execute_values sends"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.connection.current
+
+
+class FakeConnection:
+    encoding = 'UTF8'
+
+    def __init__(self, current=()):
+        self.current = list(current)
+        self.closed = []
+        self.opened = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def fake_execute_values(cursor, query, rows, page_size=None):
+    target = cursor.connection.closed if query == fare_history.CLOSE_QUERY \
+        else cursor.connection.opened
+    target.extend(rows)
+
+
+def history(connection, monkeypatch):
+    import psycopg2.extras
+
+    monkeypatch.setattr(psycopg2.extras, 'execute_values',
+                        fake_execute_values)
+    return FareHistory(connection, key=lambda record: 'Q',
+                       release=lambda connection: None, clock=lambda: NOW)
+
+
+def stored(vehicle_type, price_cents):
+    return ('Q', vehicle_type, 'M', 0, price_cents, None, None, None, None,
+            None)
+
+
+def test_complete_snapshot_closes_missing_and_repriced(monkeypatch):
+    connection = FakeConnection([stored('Sedan', 10000),
+                                 stored('SUV', 15000),
+                                 stored('Van', 20000)])
+    writer = history(connection, monkeypatch)
+    writer.write([vehicle('Sedan', '$100.00'), vehicle('SUV', '$160.00')])
+    writer.mark_complete('Q')
+    writer.flush()
+
+    assert sorted(connection.closed) == [('Q', 'SUV', 'M', 0, NOW),
+                                         ('Q', 'Van', 'M', 0, NOW)]
+    assert [row[:5] for row in connection.opened] == \
+        [('Q', 'SUV', 'M', 0, 16000)]
+    assert writer.stats['removed'] == 1
+    assert writer.stats['unchanged'] == 1
+
+
+def test_partial_snapshot_keeps_vehicles_it_did_not_see(monkeypatch):
+    connection = FakeConnection([stored('Sedan', 10000),
+                                 stored('Van', 20000)])
+    writer = history(connection, monkeypatch)
+    writer.write([vehicle('Sedan', '$110.00')])
+    writer.flush()
+
+    assert connection.closed == [('Q', 'Sedan', 'M', 0, NOW)]
+    assert writer.stats['partial'] == 1
+    assert writer.stats['removed'] == 0
+    # the unseen vehicle stays current in memory as in the database
+    assert ('Van', 'M', 0) in writer.current['Q']
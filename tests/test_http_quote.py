@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+import http_quote
+import vehicle_parser
+from location_resolver import LocationResolver
+from stub_server import Faults, start_stub_server
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), 'Data')
+
+
+@pytest.fixture
+def run(monkeypatch, tmp_path):
+    servers = []
+    closed = []
+    engines = []
+    monkeypatch.setattr(LocationResolver, 'close',
+                        lambda self, close=LocationResolver.close: (
+                            closed.append(self), close(self)))
+    parse_html = vehicle_parser.parse_html
+    monkeypatch.setattr(http_quote, 'parse_html',
+                        lambda content, engine='lxml': (
+                            engines.append(engine),
+                            parse_html(content, engine))[1])
+
+    def start(failure_rate):
+        server, base_url = start_stub_server(
+            DATA, 0, Faults(0, 0, failure_rate, seed=0))
+        servers.append(server)
+        monkeypatch.setattr(sys, 'argv', [
+            'http_quote.py', '--base_url', base_url, '--engine', 'soup',
+            '--location_cache', str(tmp_path / 'locations.db')])
+        http_quote.fetch_and_parse(http_quote.get_args())
+
+    yield start, closed, engines
+    for server in servers:
+        server.shutdown()
+
+
+def test_pages_parse_with_the_chosen_engine(run):
+    start, closed, engines = run
+    start(0.0)
+    assert engines == ['soup'] * 3
+    assert len(closed) == 1
+
+
+def test_resolver_closes_when_a_fetch_fails(run):
+    start, closed, engines = run
+    with pytest.raises(Exception):
+        start(1.0)
+    assert len(closed) == 1
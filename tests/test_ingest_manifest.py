@@ -0,0 +1,106 @@
+import os
+
+from ingest_manifest import UPSERT_QUERY, IngestManifest, file_hash
+
+
+class FakeCursor:
+    """Serves stored manifest rows and records the upserted ones"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def __iter__(self):
+        return iter(self.connection.stored)
+
+    def execute(self, query, params=None):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self, stored=()):
+        self.stored = list(stored)
+        self.saved = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def fake_execute_values(cursor, query, rows, page_size=None):
+    assert query == UPSERT_QUERY
+    cursor.connection.saved.extend(rows)
+
+
+def page(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def stored_row(file_path):
+    stat = os.stat(file_path)
+    return file_hash(file_path), file_path, stat.st_mtime, stat.st_size
+
+
+def test_unchanged_file_is_skipped_without_hashing(tmp_path, monkeypatch):
+    path = page(tmp_path, 'page_0.html', '<html>a</html>')
+    manifest = IngestManifest(FakeConnection([stored_row(path)]))
+    monkeypatch.setattr('ingest_manifest.file_hash', None)
+    assert not manifest.is_new(path)
+    assert manifest.pending == []
+
+
+def test_copied_content_is_skipped_and_its_stat_saved(tmp_path, monkeypatch):
+    import psycopg2.extras
+
+    monkeypatch.setattr(psycopg2.extras, 'execute_values',
+                        fake_execute_values)
+    original = page(tmp_path, 'page_0.html', '<html>a</html>')
+    connection = FakeConnection([stored_row(original)])
+    manifest = IngestManifest(connection)
+    copy = page(tmp_path, 'page_1.html', '<html>a</html>')
+
+    assert not manifest.is_new(copy)
+    manifest.save()
+    assert [row[1:] for row in connection.saved] == \
+        [stored_row(copy)[1:] + (0,)]
+
+
+def test_new_content_is_claimed_once_per_run(tmp_path, monkeypatch):
+    import psycopg2.extras
+
+    monkeypatch.setattr(psycopg2.extras, 'execute_values',
+                        fake_execute_values)
+    connection = FakeConnection()
+    manifest = IngestManifest(connection)
+    first = page(tmp_path, 'page_0.html', '<html>b</html>')
+    second = page(tmp_path, 'page_1.html', '<html>b</html>')
+
+    assert manifest.is_new(first)
+    assert not manifest.is_new(second)
+    manifest.mark_loaded(first, 12)
+    manifest.save()
+
+    # one row per content hash, carrying the loaded file's vehicle count
+    assert len(connection.saved) == 1
+    assert connection.saved[0][0] == file_hash(first)
+    assert connection.saved[0][4] == 12
+    assert manifest.pending == []
+
+
+def test_save_without_changes_writes_nothing(tmp_path):
+    connection = FakeConnection()
+    IngestManifest(connection).save()
+    assert connection.saved == []
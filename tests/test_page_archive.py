@@ -0,0 +1,23 @@
+import os
+
+from page_archive import PageArchive, pack_directory
+from quote_params import QUOTE_KEY_FILE
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+def test_pack_keys_pages_by_saved_quote_key(tmp_path):
+    root = tmp_path / 'Data'
+    write(str(root / 'page_0.html'), '<html>top</html>')
+    write(str(root / QUOTE_KEY_FILE), 'date=08/09/2024|time=12:00 PM\n')
+    write(str(root / 'unkeyed' / 'page_0.html'), '<html>nested</html>')
+
+    with PageArchive(str(tmp_path / 'pages'), 'zlib') as archive:
+        assert pack_directory(str(root), archive) == 2
+        keys = sorted(entry[0] for entry in archive.entries())
+
+    assert keys == ['date=08/09/2024|time=12:00 PM', 'unkeyed']
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+import pipeline
+from quote_cache import QuoteCache
+from stub_server import Faults, start_stub_server
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), 'Data')
+
+
+def pipeline_args(monkeypatch, tmp_path, base_url):
+    monkeypatch.setattr(sys, 'argv', [
+        'pipeline.py', '--mode', 'http', '--base_url', base_url,
+        '--cache_file', str(tmp_path / 'cache.sqlite'),
+        '--archive_file', str(tmp_path / 'pages'), '-n'])
+    return pipeline.get_args()
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(failure_rate):
+        server, base_url = start_stub_server(
+            DATA, 0, Faults(0, 0, failure_rate, seed=0))
+        servers.append(server)
+        return base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_complete_quote_is_cached(monkeypatch, tmp_path, stub):
+    args = pipeline_args(monkeypatch, tmp_path, stub(0.0))
+    result = pipeline.run(args, None)
+    assert result.pages == 3
+    cache = QuoteCache(args.cache_ttl, path=args.cache_file)
+    try:
+        assert len(cache.get(args)) == result.vehicles
+    finally:
+        cache.close()
+
+
+def test_failed_quote_is_not_cached_and_stores_close(monkeypatch, tmp_path,
+                                                     stub):
+    args = pipeline_args(monkeypatch, tmp_path, stub(1.0))
+    closed = []
+    for name, module in (('QuoteCache', 'quote_cache'),
+                         ('PageArchive', 'page_archive')):
+        cls = getattr(__import__(module), name)
+        monkeypatch.setattr(
+            cls, 'close',
+            lambda self, close=cls.close, name=name: (
+                closed.append(name), close(self)))
+
+    with pytest.raises(Exception):
+        pipeline.run(args, None)
+    assert sorted(closed) == ['PageArchive', 'QuoteCache']
+    cache = QuoteCache(args.cache_ttl, path=args.cache_file)
+    try:
+        assert cache.get(args) is None
+    finally:
+        cache.close()
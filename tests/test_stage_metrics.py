@@ -0,0 +1,14 @@
+from stage_metrics import Metrics
+
+
+def test_label_values_are_escaped_in_prometheus_text():
+    metrics = Metrics()
+    metrics.inc('pages', file='C:\\data\\"page".html\nnext')
+    metrics.observe('fetch_seconds', 0.2, mode='a"b')
+    text = metrics.prometheus_text()
+
+    assert 'file="C:\\\\data\\\\\\"page\\".html\\nnext"' in text
+    assert 'mode="a\\"b",le="0.25"' in text
+    # every sample stays on its own line
+    assert all(line.startswith(('#', 'mayslimo_pages', 'mayslimo_fetch'))
+               for line in text.splitlines())
@@ -0,0 +1,177 @@
+import csv
+
+from vehicle_store import (COPY_NULL, QUOTE_COLUMNS, VEHICLE_DATA_COLUMNS,
+                           VehicleWriter, number_listings, quote_row)
+
+
+class FakeCursor:
+    """Records statements and COPY payloads instead of running them"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=None):
+        if isinstance(query, bytes):
+            query = query.decode(self.connection.encoding)
+        self.connection.statements.append(query)
+
+    def mogrify(self, template, args):
+        # execute_values builds its VALUES list from these
+        return ('(' + ', '.join(map(repr, args)) + ')').encode()
+
+    def copy_expert(self, query, buffer):
+        self.connection.statements.append(query)
+        self.connection.payloads.append(buffer.read())
+
+
+class FakeConnection:
+    encoding = 'UTF8'
+
+    def __init__(self):
+        self.statements = []
+        self.payloads = []
+        self.commits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.commits += exc_type is None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def quotes_writer(connection, **kwargs):
+    return VehicleWriter(connection, table='vehicle_quotes',
+                         columns=QUOTE_COLUMNS, normalize=quote_row,
+                         missing=None, on_conflict='DO NOTHING',
+                         prepare=number_listings,
+                         release=lambda connection: None, **kwargs)
+
+
+def copied_rows(connection):
+    return [row for payload in connection.payloads
+            for row in csv.reader(payload.splitlines())]
+
+
+def test_copy_keeps_empty_quote_key_apart_from_null():
+    connection = FakeConnection()
+    writer = quotes_writer(connection)
+    writer.write([{'Vehicle_Type': 'Sedan', 'Price': '$10.00'}])
+    writer.flush()
+
+    row = dict(zip((column for column, _ in QUOTE_COLUMNS),
+                   copied_rows(connection)[0]))
+    # natural key defaults are empty strings, not NULL
+    assert row['quote_key'] == ''
+    assert row['pickup_location'] == ''
+    assert row['pickup_at'] == '-infinity'
+    assert row['page_no'] == '0'
+    # other missing values are NULL
+    assert row['vehicle_model'] == COPY_NULL
+    assert row['price_cents'] == '1000'
+    copy = [query for query in connection.statements
+            if query.startswith('COPY')][0]
+    assert f"NULL '{COPY_NULL}'" in copy
+
+
+def test_repeated_vehicle_type_gets_its_own_listing_no():
+    connection = FakeConnection()
+    writer = quotes_writer(connection)
+    page = [{'Vehicle_Type': 'Sedan', 'Price': '$10.00', 'Page_No': 0},
+            {'Vehicle_Type': 'SUV', 'Price': '$20.00', 'Page_No': 0},
+            {'Vehicle_Type': 'Sedan', 'Price': '$12.00', 'Page_No': 0}]
+    writer.write(page)
+    writer.write([{'Vehicle_Type': 'Sedan', 'Price': '$11.00',
+                   'Page_No': 1}])
+    writer.flush()
+
+    listing_no = [column for column, _ in QUOTE_COLUMNS].index('listing_no')
+    assert [row[listing_no] for row in copied_rows(connection)] == \
+        ['0', '0', '1', '0']
+
+
+VEHICLE = {'Vehicle_Type': 'Sedan', 'Vehicle_Model': 'Town Car',
+           'Price': '$10.00'}
+
+
+def test_copy_streams_rows_straight_into_the_table():
+    connection = FakeConnection()
+    writer = VehicleWriter(connection, release=lambda connection: None)
+    writer.write([VEHICLE])
+    writer.flush()
+
+    column_list = ', '.join(column for column, _ in VEHICLE_DATA_COLUMNS)
+    assert connection.statements == [
+        f'COPY vehicle_data ({column_list}) '
+        f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"]
+    row = dict(zip((key for _, key in VEHICLE_DATA_COLUMNS),
+                   copied_rows(connection)[0]))
+    assert row['Vehicle_Model'] == 'Town Car'
+    # text tables write missing fields as 'NA'
+    assert row['Pick_Up_Location'] == 'NA'
+    assert connection.commits == 1
+
+
+def test_values_inserts_every_row_in_one_statement():
+    connection = FakeConnection()
+    writer = VehicleWriter(connection, method='values', batch_size=2,
+                           release=lambda connection: None)
+    writer.write([VEHICLE, dict(VEHICLE, Vehicle_Model='Escalade'),
+                  dict(VEHICLE, Vehicle_Model='Suburban')])
+    writer.flush()
+
+    column_list = ', '.join(column for column, _ in VEHICLE_DATA_COLUMNS)
+    first, second = connection.statements
+    assert first.startswith(
+        f'INSERT INTO vehicle_data ({column_list}) VALUES (')
+    assert "'Town Car'" in first and "'Escalade'" in first
+    assert "'Suburban'" in second and 'ON CONFLICT' not in second
+    assert connection.payloads == []
+    assert writer.batches_written == connection.commits == 2
+
+
+def test_conflicts_copy_through_a_staging_table():
+    connection = FakeConnection()
+    writer = quotes_writer(connection)
+    writer.write([VEHICLE])
+    writer.flush()
+
+    column_list = ', '.join(column for column, _ in QUOTE_COLUMNS)
+    assert connection.statements == [
+        'CREATE TEMP TABLE IF NOT EXISTS vehicle_quotes_stage '
+        '(LIKE vehicle_quotes INCLUDING DEFAULTS) ON COMMIT DELETE ROWS',
+        f'COPY vehicle_quotes_stage ({column_list}) '
+        f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+        f'INSERT INTO vehicle_quotes ({column_list}) '
+        f'SELECT {column_list} FROM vehicle_quotes_stage '
+        f'ON CONFLICT DO NOTHING']
+    assert len(copied_rows(connection)) == 1
+
+
+def test_conflicts_with_values_append_the_clause():
+    connection = FakeConnection()
+    writer = quotes_writer(connection, method='values')
+    writer.write([VEHICLE])
+    writer.flush()
+
+    statement, = connection.statements
+    assert statement.startswith('INSERT INTO vehicle_quotes (')
+    assert statement.endswith(' ON CONFLICT DO NOTHING')
+    assert "'Town Car'" in statement
+
+
+def test_close_drops_unflushed_rows():
+    connection = FakeConnection()
+    writer = VehicleWriter(connection, release=lambda connection: None)
+    writer.write([VEHICLE])
+    writer.close()
+    assert connection.statements == []
+    assert writer.rows_written == 0
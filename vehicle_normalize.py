@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-10
+Purpose: Convert parsed vehicle records to typed column values
+"""
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Format of the step-info-date heading, e.g. 05/30/2024 10:30 AM
+DATE_TIME_FORMAT = '%m/%d/%Y %I:%M %p'
+
+# Rate detail labels carry the percentage, e.g. 'Std Grat(20.00%)',
+# so they are matched on their prefix
+RATE_DETAIL_PREFIXES = (
+    ('flat_rate_cents', 'Flat Rate'),
+    ('gratuity_cents', 'Std Grat'),
+    ('tax_cents', 'GA State Taxes'),
+)
+
+# Fields of a normalized vehicle, in vehicle_quotes column order
+RECORD_FIELDS = ('vehicle_type', 'vehicle_model', 'price_cents',
+                 'passenger_no', 'luggage_no', 'pickup_at', 'pickup_location',
+                 'dropoff_location', 'flat_rate_cents', 'gratuity_cents',
+                 'tax_cents', 'page_no')
+
+_NON_AMOUNT = re.compile(r'[^0-9.\-]')
+
+
+def parse_cents(text):
+    """'$1,234.56' -> 123456, None when there is no amount"""
+    if not text or text == 'NA':
+        return None
+    try:
+        amount = Decimal(_NON_AMOUNT.sub('', text))
+    except InvalidOperation:
+        return None
+    return int((amount * 100).to_integral_value())
+
+
+def parse_count(text):
+    """'10' -> 10, None when the text is not a whole number"""
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_date_time(text):
+    """'05/30/2024 10:30 AM' -> datetime, None when it does not match"""
+    try:
+        return datetime.strptime(' '.join(text.split()), DATE_TIME_FORMAT)
+    except (AttributeError, ValueError):
+        return None
+
+
+def normalize_vehicle(vehicle):
+    """Typed copy of a vehicle record, keyed by vehicle_quotes column"""
+    typed = {
+        'vehicle_type': vehicle.get('Vehicle_Type'),
+        'vehicle_model': vehicle.get('Vehicle_Model'),
+        'price_cents': parse_cents(vehicle.get('Price')),
+        'passenger_no': parse_count(vehicle.get('Passenger_No')),
+        'luggage_no': parse_count(vehicle.get('Luggage_No')),
+        'pickup_at': parse_date_time(vehicle.get('Date_Time')),
+        'pickup_location': vehicle.get('Pick_Up_Location'),
+        'dropoff_location': vehicle.get('Drop_Off_Location'),
+        'page_no': parse_count(vehicle.get('Page_No')),
+    }
+    for column, _ in RATE_DETAIL_PREFIXES:
+        typed[column] = None
+    for label, value in vehicle.items():
+        for column, prefix in RATE_DETAIL_PREFIXES:
+            if label.startswith(prefix):
+                typed[column] = parse_cents(value)
+    return typed
+
+
+class VehicleRecord:
+    """Slotted, typed vehicle: no per-row key strings or dict overhead.
+
+    get() mirrors dict.get, so a record can stand in for the dict from
+    normalize_vehicle, e.g. as a VehicleWriter normalize function.
+    """
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, **values):
+        for field in RECORD_FIELDS:
+            setattr(self, field, values.get(field))
+
+    @classmethod
+    def from_vehicle(cls, vehicle):
+        """Record from a parsed vehicle dict"""
+        return cls(**normalize_vehicle(vehicle))
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in RECORD_FIELDS}
+
+    def __eq__(self, other):
+        return (isinstance(other, VehicleRecord)
+                and self.as_dict() == other.as_dict())
+
+    def __repr__(self):
+        values = ', '.join(f'{field}={getattr(self, field)!r}'
+                           for field in RECORD_FIELDS)
+        return f'VehicleRecord({values})'
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-02
+Purpose: Shared vehicle grid parser for saved booking pages
+"""
+from lxml import etree, html
+
+from stage_metrics import METRICS
+
+# Where the crawler saves page sources and the storage scripts read them;
+# the recorded fixtures under Data/ are kept apart from live crawl output
+DATA_DIR = 'data'
+
+# Engines usable with parse_html / parse_html_file
+ENGINES = ('lxml', 'selectolax', 'soup', 'lxml_stream', 'soup_strained')
+DEFAULT_ENGINE = 'lxml'
+
+# Selective engines build only these div subtrees: the quote date, the
+# pickup/dropoff paragraphs and one block per vehicle. The rest of the page
+# is date picker cells, forms and scripts.
+SUMMARY_CLASSES = ('step-info-date', 'step-info-location')
+SELECTED_CLASSES = SUMMARY_CLASSES + ('vehicle-grid-item', )
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def _has_class(name):
+    """XPath predicate matching a single class token"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Compiled once at import, reused for every page
+_ADDRESS_P = etree.XPath(
+    "//p[.//svg[@class='svg-icon svg-location']]")
+_DATE_H6 = etree.XPath(
+    f"((//div[{_has_class('step-info-date')}])[1]//h6)[1]")
+_VEHICLE_ITEMS = etree.XPath(
+    f"//div[{_has_class('vehicle-grid-item')}]")
+_HEADING = etree.XPath(
+    f"(.//h2[{_has_class('vehicle-grid-item-heading')}])[1]")
+_MODEL_P = etree.XPath(
+    "((.//div[starts-with(@id, 'vehicleDescription')])[1]//p)[1]")
+_PRICE = etree.XPath(
+    f"(.//div[{_has_class('vehicle-grid-item-price-numb')}])[1]")
+_ADDONS = etree.XPath(
+    f".//span[{_has_class('input-group-addon')}]")
+_RATE_ROWS = etree.XPath(
+    f"(.//table[@class='table table-striped table-sm'])[1]"
+    f"//tr[{_has_class('child')}]")
+_PAGE_LINKS = etree.XPath(
+    f"//ul[{_has_class('pagination')}]/li[{_has_class('page')}]")
+_SUMMARY_ADDRESS_P = etree.XPath(
+    ".//p[.//svg[@class='svg-icon svg-location']]")
+_SUMMARY_DATE_H6 = etree.XPath(
+    f"((descendant-or-self::div[{_has_class('step-info-date')}])[1]//h6)[1]")
+_TEXT = etree.XPath(".//text()")
+_TH = etree.XPath(".//th")
+_TD = etree.XPath(".//td")
+
+
+def build_vehicle(vehicle_type, vehicle_model, price, pass_no, lag_no,
+                  date_time, addresses, rate_details):
+    """Assemble one vehicle record in the shared key layout"""
+    vehicle_data = {
+        'Vehicle_Type': vehicle_type,
+        'Vehicle_Model': vehicle_model,
+        'Price': price,
+        'Passenger_No': pass_no,
+        'Luggage_No': lag_no,
+        'Date_Time': date_time,
+    }
+
+    # Check if there are addresses and assign them
+    if len(addresses) > 0:
+        vehicle_data['Pick_Up_Location'] = addresses[0]
+    if len(addresses) > 1:
+        vehicle_data['Drop_Off_Location'] = addresses[1]
+
+    # Add rate details to the vehicle data
+    vehicle_data.update(rate_details)
+    return vehicle_data
+
+
+# --------------------------------------------------
+def _lxml_text(element):
+    """Equivalent of BeautifulSoup's get_text()"""
+    return ''.join(_TEXT(element))
+
+
+def _lxml_stripped_text(element):
+    """Equivalent of BeautifulSoup's get_text(strip=True)"""
+    return ''.join(s.strip() for s in _TEXT(element))
+
+
+def _first_text(xpath, element, default='NA'):
+    """Stripped text of the first xpath match or the default"""
+    found = xpath(element)
+    return _lxml_text(found[0]).strip() if found else default
+
+
+def _lxml_vehicles(vehicle_items, date_time, addresses):
+    """Vehicle records from vehicle-grid-item elements"""
+    vehicles = []
+    for vehicle_item in vehicle_items:
+        addons = _ADDONS(vehicle_item)
+        rate_details = {}
+        for row in _RATE_ROWS(vehicle_item):
+            cells = _TH(row) + _TD(row)
+            if len(cells) == 2:
+                rate_details[_lxml_stripped_text(cells[0])] = \
+                    _lxml_stripped_text(cells[1])
+
+        vehicles.append(build_vehicle(
+            _first_text(_HEADING, vehicle_item, ''),
+            _first_text(_MODEL_P, vehicle_item),
+            _first_text(_PRICE, vehicle_item),
+            _lxml_text(addons[1]).strip() if len(addons) > 1 else 'NA',
+            _lxml_text(addons[3]).strip() if len(addons) > 3 else 'NA',
+            date_time, addresses, rate_details))
+
+    return vehicles
+
+
+def parse_lxml(content):
+    """Parse page content with lxml and compiled XPath expressions"""
+    root = html.fromstring(content)
+
+    addresses = [_lxml_stripped_text(p) for p in _ADDRESS_P(root)]
+    date_time = _first_text(_DATE_H6, root)
+    return _lxml_vehicles(_VEHICLE_ITEMS(root), date_time, addresses)
+
+
+def _selected_divs(content, chunk_size=STREAM_CHUNK_SIZE):
+    """Summary and vehicle divs of a page, fed to lxml chunk by chunk.
+
+    Any other div is cleared as soon as it closes unless it lies inside a
+    selected one, so the tree never holds more than the selected subtrees
+    plus the div being parsed.
+    """
+    parser = etree.HTMLPullParser(events=('start', 'end'), tag='div')
+    summaries, vehicle_items = [], []
+    depth = 0
+    for start in range(0, len(content), chunk_size):
+        parser.feed(content[start:start + chunk_size])
+        for event, element in parser.read_events():
+            classes = (element.get('class') or '').split()
+            if 'vehicle-grid-item' in classes:
+                selected = vehicle_items
+            elif any(name in classes for name in SUMMARY_CLASSES):
+                selected = summaries
+            else:
+                selected = None
+
+            if event == 'start':
+                depth += selected is not None
+            elif selected is not None:
+                depth -= 1
+                selected.append(element)
+            elif depth == 0:
+                element.clear(keep_tail=True)
+    parser.close()
+    return summaries, vehicle_items
+
+
+def parse_lxml_stream(content):
+    """Parse only the summary and vehicle subtrees with an lxml pull parser"""
+    summaries, vehicle_items = _selected_divs(content)
+
+    addresses = [_lxml_stripped_text(p) for summary in summaries
+                 for p in _SUMMARY_ADDRESS_P(summary)]
+    date_time = 'NA'
+    for summary in summaries:
+        if _SUMMARY_DATE_H6(summary):
+            date_time = _first_text(_SUMMARY_DATE_H6, summary)
+            break
+    return _lxml_vehicles(vehicle_items, date_time, addresses)
+
+
+def parse_page_count(content):
+    """Number of result pages in the vehicle grid pagination (at least 1)"""
+    return max(1, len(_PAGE_LINKS(html.fromstring(content))))
+
+
+# --------------------------------------------------
+def parse_selectolax(content):
+    """Parse page content with selectolax CSS selectors"""
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(content)
+
+    def stripped_text(node):
+        return node.text(deep=True, separator='', strip=True)
+
+    def first_text(node, selector, default='NA'):
+        found = node.css_first(selector)
+        return found.text(deep=True).strip() if found else default
+
+    addresses = [
+        stripped_text(p) for p in tree.css('p')
+        if p.css_first('svg[class="svg-icon svg-location"]')
+    ]
+    date_time = 'NA'
+    date_time_element = tree.css_first('div.step-info-date')
+    if date_time_element:
+        date_time = first_text(date_time_element, 'h6')
+
+    vehicles = []
+    for vehicle_item in tree.css('div.vehicle-grid-item'):
+        model_container = vehicle_item.css_first(
+            'div[id^="vehicleDescription"]')
+        vehicle_model = 'NA'
+        if model_container:
+            vehicle_model = first_text(model_container, 'p')
+
+        addons = vehicle_item.css('span.input-group-addon')
+        rate_details = {}
+        rate_table = vehicle_item.css_first(
+            'table[class="table table-striped table-sm"]')
+        if rate_table:
+            for row in rate_table.css('tr.child'):
+                cells = row.css('th') + row.css('td')
+                if len(cells) == 2:
+                    rate_details[stripped_text(cells[0])] = \
+                        stripped_text(cells[1])
+
+        vehicles.append(build_vehicle(
+            first_text(vehicle_item, 'h2.vehicle-grid-item-heading', ''),
+            vehicle_model,
+            first_text(vehicle_item, 'div.vehicle-grid-item-price-numb'),
+            addons[1].text(deep=True).strip() if len(addons) > 1 else 'NA',
+            addons[3].text(deep=True).strip() if len(addons) > 3 else 'NA',
+            date_time, addresses, rate_details))
+
+    return vehicles
+
+
+# --------------------------------------------------
+def parse_soup(content):
+    """Reference BeautifulSoup parser, kept for parity checks"""
+    from bs4 import BeautifulSoup
+
+    return _soup_vehicles(BeautifulSoup(content, 'lxml'))
+
+
+def parse_soup_strained(content):
+    """BeautifulSoup parser building only the summary and vehicle subtrees"""
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    only = SoupStrainer('div', class_=list(SELECTED_CLASSES))
+    return _soup_vehicles(BeautifulSoup(content, 'lxml', parse_only=only))
+
+
+def _soup_vehicles(soup):
+    """Vehicle records from a parsed page"""
+    # Extract addresses
+    addresses = []
+    for p in soup.find_all('p'):
+        if p.find('svg', class_='svg-icon svg-location'):
+            address = p.get_text(strip=True)  # Extract and strip text from <p>
+            addresses.append(address)
+
+    # Extract date and time
+    date_time = 'NA'
+    date_time_element = soup.find('div', class_='step-info-date')
+    if date_time_element:
+        date_time = date_time_element.find('h6').text.strip()
+
+    # Extract data for each vehicle grid item
+    vehicles = []
+    for vehicle_item in soup.find_all('div', class_='vehicle-grid-item'):
+        # Get vehicle type
+        vehicle_type = vehicle_item.find(
+            'h2', class_='vehicle-grid-item-heading').text.strip()
+
+        # Get vehicle model (from description)
+        model_description_container = vehicle_item.find(
+            'div', id=lambda x: x and x.startswith('vehicleDescription'))
+        if model_description_container:
+            vehicle_model = model_description_container.find('p').text.strip()
+        else:
+            vehicle_model = 'NA'  # Not Available
+
+        # Get price
+        price_container = vehicle_item.find(
+            'div', class_='vehicle-grid-item-price-numb')
+        price = price_container.get_text().strip() if price_container else 'NA'
+
+        # Get number of passengers & luggage
+        pass_container = vehicle_item.find_all('span',
+                                               class_='input-group-addon')
+        pass_no = pass_container[1].text.strip() if len(
+            pass_container) > 1 else 'NA'
+        lag_no = pass_container[3].text.strip() if len(
+            pass_container) > 3 else 'NA'
+
+        # Extract rate details from the table
+        rate_details = {}
+        rate_table = vehicle_item.find('table',
+                                       class_='table table-striped table-sm')
+        if rate_table:
+            for row in rate_table.find_all('tr', class_='child'):
+                cells = row.find_all('th') + row.find_all('td')
+                if len(cells) == 2:
+                    rate_details[cells[0].get_text(
+                        strip=True)] = cells[1].get_text(strip=True)
+
+        vehicles.append(build_vehicle(vehicle_type, vehicle_model, price,
+                                      pass_no, lag_no, date_time, addresses,
+                                      rate_details))
+
+    return vehicles
+
+
+_PARSERS = {
+    'lxml': parse_lxml,
+    'selectolax': parse_selectolax,
+    'soup': parse_soup,
+    'lxml_stream': parse_lxml_stream,
+    'soup_strained': parse_soup_strained,
+}
+
+
+# --------------------------------------------------
+def parse_html(content, engine=DEFAULT_ENGINE):
+    """Parse page content into a list of vehicle records"""
+    try:
+        parser = _PARSERS[engine]
+    except KeyError:
+        raise ValueError(
+            f"Unknown parse engine {engine!r}, expected one of {ENGINES}")
+    with METRICS.time('parse_seconds', engine=engine):
+        vehicles = parser(content)
+    METRICS.inc('pages_parsed', engine=engine)
+    METRICS.inc('vehicles_parsed', len(vehicles), engine=engine)
+    return vehicles
+
+
+def parse_html_file(file_path, engine=DEFAULT_ENGINE):
+    """Parse a saved booking page into a list of vehicle records"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        content = file.read()
+    return parse_html(content, engine)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-08-01
+Purpose: Console reporting of parsed vehicles, kept off the parse path
+"""
+import sys
+import time
+
+# quiet: nothing; summary: one line at the end; table: every vehicle
+REPORT_MODES = ('quiet', 'summary', 'table')
+
+# Column labels for the printed table, keyed by vehicle record field
+TABLE_COLUMNS = {
+    'Vehicle Type': 'Vehicle_Type',
+    'Vehicle Model': 'Vehicle_Model',
+    'Price': 'Price',
+    'Passenger No.': 'Passenger_No',
+    'Luggage No': 'Luggage_No',
+    'Date & Time': 'Date_Time',
+    'Pick-Up Location': 'Pick_Up_Location',
+    'Drop-Off Location': 'Drop_Off_Location',
+}
+
+
+class VehicleReporter:
+    """Receives each file's parsed vehicles and prints what the mode asks.
+
+    Only the table mode formats rows, so quiet and summary runs cost a
+    couple of counter updates per file.
+    """
+
+    def __init__(self, mode='summary', stream=None):
+        if mode not in REPORT_MODES:
+            raise ValueError(
+                f"Unknown report mode {mode!r}, expected one of "
+                f"{REPORT_MODES}")
+        self.mode = mode
+        self.stream = stream or sys.stdout
+        self.started = time.perf_counter()
+        self.files = 0
+        self.vehicles = 0
+
+    def __call__(self, file_path, vehicles):
+        self.files += 1
+        self.vehicles += len(vehicles)
+        if self.mode == 'table':
+            self.print_table(file_path, vehicles)
+
+    def print_table(self, file_path, vehicles):
+        """Print data in a tabular format"""
+        lines = [file_path, " | ".join(TABLE_COLUMNS), "-" * 100]
+        lines.extend(
+            " | ".join(vehicle.get(key, 'NA')
+                       for key in TABLE_COLUMNS.values())
+            for vehicle in vehicles)
+        self.stream.write('\n'.join(lines) + '\n')
+
+    def finish(self):
+        """Print the run summary, unless quiet"""
+        if self.mode == 'quiet':
+            return
+        elapsed = time.perf_counter() - self.started
+        self.stream.write(f'{self.files} files, {self.vehicles} vehicles '
+                          f'in {elapsed:.2f}s\n')
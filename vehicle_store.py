@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+"""
+Author : stan <stan@localhost>
+Date   : 2024-07-08
+Purpose: Batched PostgreSQL writer for parsed vehicle records
+"""
+import csv
+import io
+
+from stage_metrics import METRICS
+from vehicle_normalize import RECORD_FIELDS, normalize_vehicle, parse_count
+
+# (column, vehicle record key) for the vehicle_data table of spider_db.py
+VEHICLE_DATA_COLUMNS = (
+    ('Vehicle_Type', 'Vehicle_Type'),
+    ('Vehicle_Model', 'Vehicle_Model'),
+    ('Price', 'Price'),
+    ('Passenger_No', 'Passenger_No'),
+    ('Luggage_No', 'Luggage_No'),
+    ('Date_Time', 'Date_Time'),
+    ('Pick_Up_Location', 'Pick_Up_Location'),
+    ('Drop_Off_Location', 'Drop_Off_Location'),
+    ('Flat_Rate', 'Flat Rate'),
+    ('Std_Grat', 'Std Grat(20.00%)'),
+    ('GA_State_Taxes', 'GA State Taxes(7.00%)'),
+)
+
+# (column, vehicle record key) for the vehicles table of soup_postgres_store.py
+VEHICLES_COLUMNS = (
+    ('vehicle_type', 'Vehicle_Type'),
+    ('vehicle_model', 'Vehicle_Model'),
+    ('price', 'Price'),
+    ('passenger_no', 'Passenger_No'),
+    ('luggage_no', 'Luggage_No'),
+    ('date_time', 'Date_Time'),
+    ('pickup_location', 'Pick_Up_Location'),
+    ('dropoff_location', 'Drop_Off_Location'),
+)
+
+# Typed vehicle_quotes table from migrations/, filled from quote_row
+QUOTE_COLUMNS = tuple(
+    (column, column) for column in RECORD_FIELDS + ('quote_key', 'listing_no'))
+
+# Natural key columns of vehicle_quotes are NOT NULL, since NULLs never
+# clash in a unique index; a missing value is written as its default
+NATURAL_KEY_DEFAULTS = {
+    'quote_key': '',
+    'vehicle_type': 'NA',
+    'pickup_location': '',
+    'dropoff_location': '',
+    'pickup_at': '-infinity',
+    'page_no': 0,
+    'listing_no': 0,
+}
+
+# Parsed fields naming one listing, apart from its order on the page
+LISTING_FIELDS = ('Quote_Key', 'Page_No', 'Pick_Up_Location',
+                  'Drop_Off_Location', 'Date_Time', 'Vehicle_Type')
+
+WRITE_METHODS = ('copy', 'values')
+
+# NULL marker of the COPY payload, so an empty string stays an empty string
+COPY_NULL = r'\N'
+
+
+def copy_payload(rows):
+    """CSV text of rows for COPY ... WITH (FORMAT csv, NULL COPY_NULL)"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        tuple(COPY_NULL if value is None else value for value in row)
+        for row in rows)
+    buffer.seek(0)
+    return buffer
+
+
+def number_listings(vehicles):
+    """Set Listing_No 0, 1, ... on vehicles repeating a vehicle type on
+    one page, in page order; returns the vehicles"""
+    seen = {}
+    for vehicle in vehicles:
+        listing = tuple(vehicle.get(field) for field in LISTING_FIELDS)
+        vehicle['Listing_No'] = seen.get(listing, 0)
+        seen[listing] = vehicle['Listing_No'] + 1
+    return vehicles
+
+
+def quote_row(vehicle, quote_key=''):
+    """normalize_vehicle for vehicle_quotes: keyed by the vehicle's
+    Quote_Key, else quote_key, with defaults in place of missing natural
+    key values"""
+    typed = normalize_vehicle(vehicle)
+    typed['quote_key'] = vehicle.get('Quote_Key') or quote_key
+    typed['listing_no'] = parse_count(vehicle.get('Listing_No'))
+    for column, default in NATURAL_KEY_DEFAULTS.items():
+        if typed.get(column) is None:
+            typed[column] = default
+    return typed
+
+
+def open_pool(db_config, minconn=1, maxconn=4):
+    """Thread-safe connection pool shared by the writers of a run"""
+    from psycopg2 import pool
+
+    return pool.ThreadedConnectionPool(minconn, maxconn, **db_config)
+
+
+class VehicleWriter:
+    """Buffers vehicle records and writes them in batches.
+
+    One connection is held for the life of the writer and every batch is
+    written in its own transaction, with COPY FROM STDIN ('copy') or a
+    multi-row INSERT via execute_values ('values'). When normalize is given
+    each record is passed through it first; fields the record lacks are
+    written as missing ('NA' for the text tables, None/NULL when typed).
+    With on_conflict set (e.g. 'DO NOTHING') rows clashing with a unique
+    index are resolved by that clause; COPY then goes through a temporary
+    staging table, since COPY itself has no ON CONFLICT. prepare, when
+    given, sees each list of vehicles written before its rows are built.
+    """
+
+    def __init__(self, connection, table='vehicle_data',
+                 columns=VEHICLE_DATA_COLUMNS, batch_size=1000,
+                 method='copy', release=None, normalize=None,
+                 missing='NA', on_conflict=None, prepare=None):
+        if method not in WRITE_METHODS:
+            raise ValueError(
+                f"Unknown write method {method!r}, expected one of "
+                f"{WRITE_METHODS}")
+        self.connection = connection
+        self.table = table
+        self.columns = columns
+        self.batch_size = max(1, batch_size)
+        self.method = method
+        self.release = release or (lambda connection: connection.close())
+        self.normalize = normalize
+        self.missing = missing
+        self.on_conflict = on_conflict
+        self.prepare = prepare
+        self.rows = []
+        self.rows_written = 0
+        self.batches_written = 0
+
+    @classmethod
+    def connect(cls, db_config, **kwargs):
+        """Writer with its own connection"""
+        import psycopg2
+
+        return cls(psycopg2.connect(**db_config), **kwargs)
+
+    @classmethod
+    def from_pool(cls, connection_pool, **kwargs):
+        """Writer borrowing a pooled connection, returned on close"""
+        return cls(connection_pool.getconn(),
+                   release=connection_pool.putconn, **kwargs)
+
+    @classmethod
+    def connect_quotes(cls, db_config, quote_key='', **kwargs):
+        """Writer for the typed vehicle_quotes table; rows without their
+        own Quote_Key belong to quote_key"""
+        return cls.connect(db_config, table='vehicle_quotes',
+                           columns=QUOTE_COLUMNS,
+                           normalize=lambda vehicle: quote_row(vehicle,
+                                                               quote_key),
+                           missing=None, on_conflict='DO NOTHING',
+                           prepare=number_listings, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        self.close()
+
+    def execute(self, query):
+        """Run a one-off statement such as CREATE TABLE in its own transaction"""
+        with self.connection:
+            with self.connection.cursor() as cursor:
+                cursor.execute(query)
+
+    def row(self, vehicle):
+        """Column values for one vehicle record"""
+        if self.normalize is not None:
+            vehicle = self.normalize(vehicle)
+        return tuple(vehicle.get(key, self.missing) for _, key in self.columns)
+
+    def write(self, vehicles):
+        """Queue vehicles, flushing every time a batch fills up"""
+        if self.prepare is not None:
+            vehicles = self.prepare(vehicles)
+        for vehicle in vehicles:
+            self.rows.append(self.row(vehicle))
+            if len(self.rows) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered rows as one transaction"""
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        column_list = ', '.join(column for column, _ in self.columns)
+        conflict = ''
+        if self.on_conflict:
+            conflict = f' ON CONFLICT {self.on_conflict}'
+
+        with METRICS.time('store_flush_seconds', table=self.table,
+                          method=self.method), self.connection:
+            with self.connection.cursor() as cursor:
+                if self.method == 'copy':
+                    buffer = copy_payload(rows)
+                    target = self.table
+                    if conflict:
+                        target = f'{self.table}_stage'
+                        cursor.execute(
+                            f'CREATE TEMP TABLE IF NOT EXISTS {target} '
+                            f'(LIKE {self.table} INCLUDING DEFAULTS) '
+                            f'ON COMMIT DELETE ROWS')
+                    cursor.copy_expert(
+                        f'COPY {target} ({column_list}) '
+                        f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                        buffer)
+                    if conflict:
+                        cursor.execute(
+                            f'INSERT INTO {self.table} ({column_list}) '
+                            f'SELECT {column_list} FROM {target}{conflict}')
+                else:
+                    from psycopg2.extras import execute_values
+
+                    execute_values(
+                        cursor,
+                        f'INSERT INTO {self.table} ({column_list}) '
+                        f'VALUES %s{conflict}',
+                        rows, page_size=len(rows))
+
+        self.rows_written += len(rows)
+        self.batches_written += 1
+        METRICS.inc('rows_stored', len(rows), table=self.table)
+
+    def close(self):
+        """Drop unflushed rows and release the connection"""
+        self.rows = []
+        self.release(self.connection)